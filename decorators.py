@@ -7,6 +7,10 @@ from django.http  import JsonResponse
 
 from my_settings  import SECRET
 from users.models import User
+from users.cache  import user_cache, token_cache
+
+ACCESS_EXPIRATION_DELTA  = 600
+REFRESH_EXPIRATION_DELTA = 6000000
 
 def validate_login(func):
     def wrapper(self, request, *args, **kwargs):
@@ -15,24 +19,27 @@ def validate_login(func):
             if not access_token:
                 return JsonResponse({'message': 'login_required'}, status=401)
 
-            access_token_payload = jwt.decode(
-                    access_token,
-                    SECRET,
-                    algorithms="HS256"
-                    )
+            access_token_payload = token_cache.get(access_token)
+            if access_token_payload is None:
+                access_token_payload = jwt.decode(
+                        access_token,
+                        SECRET,
+                        algorithms="HS256"
+                        )
+                token_cache.set(access_token, access_token_payload, access_token_payload['iat'] + ACCESS_EXPIRATION_DELTA)
 
-            user = User.objects.get(id=access_token_payload['user_id'])
+            user = user_cache.get(access_token_payload['user_id'])
 
-            access_expiration_delta  = 600
-            refresh_expiration_delta = 6000000
             now = datetime.datetime.now().timestamp()
-            if now > access_token_payload['iat'] + access_expiration_delta:
+            if now > access_token_payload['iat'] + ACCESS_EXPIRATION_DELTA:
+                # Logout clears the token in the database; a cached copy from another process may be stale.
+                refresh_token         = User.objects.values_list('refresh_token', flat=True).get(id=user.id)
                 refresh_token_payload = jwt.decode(
-                        user.refresh_token,
+                        refresh_token,
                         SECRET,
                         algorithms="HS256"
                         )
-                if now > refresh_token_payload['iat'] + refresh_expiration_delta:
+                if now > refresh_token_payload['iat'] + REFRESH_EXPIRATION_DELTA:
                     return JsonResponse({'message': 'refresh_token_expired'}, status=401)
                 else:
                     access_token = jwt.encode(
@@ -0,0 +1,114 @@
+import json
+import base64
+import datetime
+from itertools           import groupby
+
+from django.db.models    import Q
+
+from orders.models       import Order
+from orders.reservations import STATUS_CANCLED
+
+ORDER_HISTORY_MAX_LIMIT = 100
+
+ORDER_HISTORY_COLUMNS = {
+    'passenger_number'        : 'scheduleorder__passenger_number',
+    'date'                    : 'scheduleorder__schedule__date',
+    'price'                   : 'scheduleorder__schedule__price',
+    'departure_location'      : 'scheduleorder__schedule__course__departure_location__name',
+    'departure_location_code' : 'scheduleorder__schedule__course__departure_location__location_code',
+    'arrival_location'        : 'scheduleorder__schedule__course__arrival_location__name',
+    'arrival_location_code'   : 'scheduleorder__schedule__course__arrival_location__location_code',
+    'taxi_company_name'       : 'scheduleorder__schedule__course__taxi_company__name',
+    'taxi_company_logo'       : 'scheduleorder__schedule__course__taxi_company__logo_url',
+}
+
+class InvalidCursor(Exception):
+    pass
+
+def encode_cursor(field, timestamp, order_id):
+    return base64.urlsafe_b64encode(json.dumps([field, timestamp.isoformat(), order_id]).encode('utf-8')).decode('utf-8')
+
+def decode_cursor(field, cursor):
+    try:
+        cursor_field, timestamp, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+        if cursor_field != field:
+            raise InvalidCursor
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+        if timestamp.tzinfo is not None:
+            raise InvalidCursor
+        return timestamp, int(order_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor
+
+def page_keys(orders, field, limit):
+    # Page on order keys first so the leg join only touches the orders being returned.
+    keys = list(orders.values_list(field, 'id')[:limit + 1])
+    return keys[:limit], len(keys) > limit
+
+def order_history(user, limit=None, cursor=None):
+    ordering = ('-created_at', '-id')
+    orders   = Order.objects.filter(user=user).exclude(status_id=STATUS_CANCLED).order_by(*ordering)
+    if cursor:
+        timestamp, order_id = decode_cursor('created_at', cursor)
+        orders = orders.filter(Q(created_at__lt=timestamp) | Q(created_at=timestamp, id__lt=order_id))
+
+    next_cursor = None
+    if limit is not None:
+        keys, more = page_keys(orders, 'created_at', limit)
+        orders     = orders.filter(id__in=[order_id for timestamp, order_id in keys])
+        if more:
+            next_cursor = encode_cursor('created_at', *keys[-1])
+    return summarize(orders, ordering), next_cursor
+
+def order_changes(user, since, limit=None):
+    # Oldest change first, so the cursor of the last row returned is where the next sync resumes.
+    # Cancelled orders stay in the feed, flagged, so clients can drop them from their copy.
+    ordering = ('updated_at', 'id')
+    orders   = Order.objects.filter(user=user).order_by(*ordering)
+    if since:
+        timestamp, order_id = decode_cursor('updated_at', since)
+        orders = orders.filter(Q(updated_at__gt=timestamp) | Q(updated_at=timestamp, id__gt=order_id))
+
+    if limit is not None:
+        keys, more = page_keys(orders, 'updated_at', limit)
+        orders     = orders.filter(id__in=[order_id for timestamp, order_id in keys])
+        last       = keys[-1] if keys else None
+    else:
+        last       = orders.values_list('updated_at', 'id').last()
+    return summarize(orders, ordering, with_status=True), encode_cursor('updated_at', *last) if last else since
+
+def summarize(orders, ordering, with_status=False):
+    # One row per leg, joined through to locations and company; orders without legs come back as a
+    # single all-NULL row from the outer join so they still fail the way the nested lookups did.
+    rows = orders.order_by(*ordering, 'scheduleorder__id').values(
+            'id', 'status_id', 'scheduleorder__id', *ORDER_HISTORY_COLUMNS.values())
+
+    results = []
+    for order_id, order_rows in groupby(rows, key=lambda row: row['id']):
+        order_rows = list(order_rows)
+        legs       = [
+                {name: row[column] for name, column in ORDER_HISTORY_COLUMNS.items()}
+                for row in order_rows if row['scheduleorder__id'] is not None ]
+
+        going      = legs[0]
+        coming     = legs[1] if len(legs) == 2 else None
+        results.append({
+            'order_id'                 : order_id,
+            'round_trip'               : '왕복' if coming else '편도',
+            'departure_location'       : going['departure_location'],
+            'departure_location_code'  : going['departure_location_code'],
+            'arrival_location'         : going['arrival_location'],
+            'arrival_location_code'    : going['arrival_location_code'],
+            'departure_date'           : going['date'].strftime('%m-%d'),
+            'comeback_date'            : coming['date'].strftime('%m-%d') if coming else None,
+            'passenger_number'         : going['passenger_number'],
+            'going_taxi_company_name'  : going['taxi_company_name'],
+            'going_taxi_company_logo'  : going['taxi_company_logo'],
+            'going_price'              : going['price'],
+            'coming_taxi_company_name' : coming['taxi_company_name'] if coming else None,
+            'coming_taxi_company_logo' : coming['taxi_company_logo'] if coming else None,
+            'coming_price'             : coming['price'] if coming else None
+        })
+        if with_status:
+            results[-1]['cancelled'] = order_rows[0]['status_id'] == STATUS_CANCLED
+    return results
@@ -0,0 +1,92 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools   import wraps
+
+from django.http import HttpResponse, JsonResponse
+
+IDEMPOTENCY_MAX_KEYS   = 10000
+IDEMPOTENCY_WINDOW     = 24 * 60 * 60
+IDEMPOTENCY_MAX_LENGTH = 255
+PENDING                = object()
+MISMATCH               = object()
+
+class IdempotencyStore:
+    def __init__(self, max_keys=IDEMPOTENCY_MAX_KEYS, window=IDEMPOTENCY_WINDOW):
+        self.max_keys = max_keys
+        self.window   = window
+        self.entries  = OrderedDict()
+        self.lock     = threading.Lock()
+
+    def begin(self, key, fingerprint):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                return entry[2] if entry[1] == fingerprint else MISMATCH
+
+            self.entries.pop(key, None)
+            self.entries[key] = (now + self.window, fingerprint, PENDING)
+            while len(self.entries) > self.max_keys:
+                self.entries.popitem(last=False)
+            return None
+
+    def finish(self, key, fingerprint, response):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (
+                    time.monotonic() + self.window,
+                    fingerprint,
+                    (response.status_code, response.content, response['Content-Type'])
+                    )
+
+    def abandon(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[2] is PENDING:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+idempotency_store = IdempotencyStore()
+
+def idempotent(func):
+    @wraps(func)
+    def wrapper(self, request, *args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            return func(self, request, *args, **kwargs)
+
+        if len(idempotency_key) > IDEMPOTENCY_MAX_LENGTH:
+            return JsonResponse({'message': 'invalid_idempotency_key'}, status=400)
+
+        # Keys are scoped to the view they were sent to and bound to the body they first arrived with.
+        key         = (request.user.id, func.__qualname__, idempotency_key)
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        stored      = idempotency_store.begin(key, fingerprint)
+        if stored is MISMATCH:
+            return JsonResponse({'message': 'idempotency_key_reused'}, status=422)
+        if stored is PENDING:
+            return JsonResponse({'message': 'request_in_progress'}, status=409)
+        if stored:
+            status, content, content_type = stored
+            response = HttpResponse(content, status=status, content_type=content_type)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = func(self, request, *args, **kwargs)
+        except Exception:
+            idempotency_store.abandon(key)
+            raise
+
+        # Only completed bookings are replayed; a failed attempt may be retried for real.
+        if 200 <= response.status_code < 300:
+            idempotency_store.finish(key, fingerprint, response)
+        else:
+            idempotency_store.abandon(key)
+        return response
+    return wrapper
@@ -0,0 +1,162 @@
+import time
+import random
+import statistics
+import threading
+from collections                 import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db                   import close_old_connections
+from django.db.models            import Sum
+from django.test                 import Client
+
+from orders.models               import ScheduleOrder, SeatHold, Status
+from orders.reservations         import STATUS_BOOK, STATUS_FINISHED, STATUS_CANCLED
+from taxis.models                import Schedule
+from taxis.seeding               import seed_timetable, purge_timetable, SEED_PREFIX
+from users.models                import User
+from users.passwords             import hash_password
+
+BENCH_PASSWORD = 'P@ssw0rd'
+
+class Command(BaseCommand):
+    help = 'Drive concurrent signin, search, book and cancel flows and check that no seat is oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--iterations', type=int, default=20, help='booking attempts per client')
+        parser.add_argument('--locations', type=int, default=3)
+        parser.add_argument('--days', type=int, default=1)
+        parser.add_argument('--courses-per-route', type=int, default=1)
+        parser.add_argument('--seat-remain', type=int, default=10, help='seats per schedule; keep it low to force contention')
+        parser.add_argument('--passengers', type=int, default=2)
+        parser.add_argument('--cancel-rate', type=float, default=0.5, help='share of successful bookings cancelled again')
+        parser.add_argument('--keep', action='store_true', help='keep the seeded timetable and users')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        for status_id, name in ((STATUS_BOOK, 'book'), (STATUS_FINISHED, 'finished'), (STATUS_CANCLED, 'canceled')):
+            Status.objects.get_or_create(id=status_id, defaults={'name': name})
+
+        timetable = seed_timetable(
+                locations         = options['locations'],
+                days              = options['days'],
+                courses_per_route = options['courses_per_route'],
+                seat_remain       = options['seat_remain'],
+                seed              = options['seed']
+                )
+        # Hashed at the configured cost, so signin measures verification rather than a first-login rehash.
+        password  = hash_password(BENCH_PASSWORD)
+        users     = [
+                User.objects.create(name='{} {}'.format(SEED_PREFIX, index), email=self.email(index), password=password)
+                for index in range(options['clients']) ]
+        self.stdout.write('seeded {} schedules and {} clients'.format(timetable['schedules'], len(users)))
+
+        latencies = defaultdict(list)
+        outcomes  = defaultdict(int)
+        lock      = threading.Lock()
+
+        def client(index):
+            try:
+                self.drive(index, options, timetable, latencies, outcomes, lock)
+            finally:
+                close_old_connections()
+
+        try:
+            threads = [threading.Thread(target=client, args=(index,)) for index in range(options['clients'])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            self.report(latencies, outcomes, elapsed)
+            self.check_conservation(options['seat_remain'])
+            if outcomes.get('signin failed'):
+                raise CommandError('{} clients could not sign in'.format(outcomes['signin failed']))
+        finally:
+            if not options['keep']:
+                User.objects.filter(email__in=[user.email for user in users]).delete()
+                purge_timetable()
+
+    def email(self, index):
+        return '{}{}@bench.example.com'.format(SEED_PREFIX.lower(), index)
+
+    def drive(self, index, options, timetable, latencies, outcomes, lock):
+        generator = random.Random('{}-{}'.format(options['seed'], index))
+        http      = Client(raise_request_exception=False)
+
+        def call(step, method, path, *args, **kwargs):
+            started  = time.perf_counter()
+            response = getattr(http, method)(path, *args, **kwargs)
+            with lock:
+                latencies[step].append((time.perf_counter() - started) * 1000)
+                outcomes['{} {}'.format(step, response.status_code)] += 1
+            return response
+
+        response = call('signin', 'post', '/users/signin',
+                {'email': self.email(index), 'password': BENCH_PASSWORD}, content_type='application/json')
+        if response.status_code != 201:
+            with lock:
+                outcomes['signin failed'] += 1
+            return
+        headers  = {'HTTP_Authorization': response.json()['access_token']}
+
+        for _ in range(options['iterations']):
+            departure, arrival = generator.sample(timetable['locations'], 2)
+            response = call('search', 'get', '/taxis', {
+                'departure_location_name' : departure,
+                'arrival_location_name'   : arrival,
+                'departure_date'          : generator.choice(timetable['dates']).strftime('%Y-%m-%d'),
+                'seat_type'               : generator.choice(timetable['seat_types']),
+                'seat_remain'             : options['passengers'],
+                'taxi_company'            : timetable['companies']
+                })
+            schedules = response.json().get('Message') or []
+            if not schedules:
+                continue
+
+            response = call('book', 'post', '/orders', {
+                'passenger_number'  : options['passengers'],
+                'going_schedule_id' : generator.choice(schedules)['id']
+                }, content_type='application/json', **headers)
+            if response.status_code != 201 or generator.random() >= options['cancel_rate']:
+                continue
+
+            order_id = ScheduleOrder.objects.filter(order__user__email=self.email(index)).exclude(order__status_id=STATUS_CANCLED)\
+                    .order_by('-order_id').values_list('order_id', flat=True).first()
+            call('cancel', 'delete', '/orders/{}'.format(order_id), **headers)
+
+    def report(self, latencies, outcomes, elapsed):
+        for step in ('signin', 'search', 'book', 'cancel'):
+            samples = latencies.get(step)
+            if not samples:
+                continue
+            percentiles = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+            self.stdout.write('{}: n {}  p50 {:.2f}ms  p95 {:.2f}ms  p99 {:.2f}ms  {:.1f}/s'.format(
+                step, len(samples), percentiles[49], percentiles[94], percentiles[98], len(samples) / elapsed))
+
+        self.stdout.write('responses: ' + ', '.join('{} x{}'.format(key, count) for key, count in sorted(outcomes.items())))
+
+    def check_conservation(self, seat_remain):
+        # Every seat is either still for sale, booked on an order or held; nothing else may consume one.
+        schedules = Schedule.objects.filter(course__taxi_code__startswith=SEED_PREFIX + '-')
+        booked    = dict(
+                ScheduleOrder.objects.filter(schedule__in=schedules).exclude(order__status_id=STATUS_CANCLED)
+                .values('schedule_id').annotate(seats=Sum('passenger_number')).values_list('schedule_id', 'seats'))
+        held      = dict(
+                SeatHold.objects.filter(schedule__in=schedules)
+                .values('schedule_id').annotate(seats=Sum('passenger_number')).values_list('schedule_id', 'seats'))
+
+        violations = [
+                (schedule_id, remain, booked.get(schedule_id, 0), held.get(schedule_id, 0))
+                for schedule_id, remain in schedules.values_list('id', 'seat_remain')
+                if remain < 0 or remain + booked.get(schedule_id, 0) + held.get(schedule_id, 0) != seat_remain ]
+
+        self.stdout.write('booked seats: {}'.format(sum(booked.values())))
+        if violations:
+            for schedule_id, remain, booked_seats, held_seats in violations[:10]:
+                self.stderr.write('schedule {}: seat_remain {} + booked {} + held {} != {}'.format(
+                    schedule_id, remain, booked_seats, held_seats, seat_remain))
+            raise CommandError('seat conservation violated on {} schedules'.format(len(violations)))
+        self.stdout.write(self.style.SUCCESS('seat conservation holds'))
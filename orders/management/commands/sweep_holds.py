@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db                   import close_old_connections
+
+from orders.reservations         import release_expired_holds
+
+class Command(BaseCommand):
+    help = 'Release seats held past their expiry, once or every --interval seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='keep sweeping every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            released = release_expired_holds()
+            if released or not options['interval']:
+                self.stdout.write('released {} expired holds'.format(released))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.3 on 2026-10-18 16:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_kakao_upsert'),
+        ('orders', '0004_waitlist_entries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingTicket',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('passenger_number', models.IntegerField()),
+                ('legs', models.JSONField()),
+                ('status', models.CharField(max_length=20)),
+                ('message', models.CharField(max_length=45, null=True)),
+                ('leg_results', models.JSONField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='orders.order')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.user')),
+            ],
+            options={
+                'db_table': 'booking_tickets',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bookingticket',
+            index=models.Index(fields=['status', 'created_at'], name='booking_tickets_status_idx'),
+        ),
+    ]
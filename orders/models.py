@@ -3,10 +3,15 @@ from django.db import models
 class Order(models.Model):
     user                 = models.ForeignKey("users.User", on_delete=models.CASCADE)
     status               = models.ForeignKey("Status", on_delete=models.CASCADE)
-    created_at           = models.DateTimeField(auto_now=True)
+    created_at           = models.DateTimeField(auto_now_add=True)
+    updated_at           = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table  = "orders"
+        indexes   = [
+            models.Index(fields=['user', 'created_at', 'id'], name='orders_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='orders_user_updated_idx'),
+        ]
 
 class Status(models.Model):
     name                 = models.CharField(max_length=45)
@@ -32,4 +37,58 @@ class Passenger(models.Model):
     order                 = models.ForeignKey("Order", on_delete=models.CASCADE)
     
     class Meta:
-        db_table = "passengers"
\ No newline at end of file
+        db_table = "passengers"
+
+class SeatHold(models.Model):
+    schedule              = models.ForeignKey("taxis.Schedule", on_delete=models.CASCADE)
+    user                  = models.ForeignKey("users.User", on_delete=models.CASCADE)
+    passenger_number      = models.IntegerField()
+    expires_at            = models.DateTimeField()
+    created_at            = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "seat_holds"
+        indexes  = [
+            models.Index(fields=['expires_at'], name='seat_holds_expires_at_idx'),
+        ]
+
+class WaitlistEntry(models.Model):
+    schedule              = models.ForeignKey("taxis.Schedule", on_delete=models.CASCADE)
+    user                  = models.ForeignKey("users.User", on_delete=models.CASCADE)
+    passenger_number      = models.IntegerField()
+    created_at            = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table    = "waitlist_entries"
+        indexes     = [
+            models.Index(fields=['schedule', 'id'], name='waitlist_schedule_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'user'], name='waitlist_schedule_user_unique'),
+        ]
+
+class BookingTicket(models.Model):
+    id                    = models.CharField(max_length=32, primary_key=True)
+    user                  = models.ForeignKey("users.User", on_delete=models.CASCADE)
+    passenger_number      = models.IntegerField()
+    legs                  = models.JSONField()
+    status                = models.CharField(max_length=20)
+    message               = models.CharField(max_length=45, null=True)
+    leg_results           = models.JSONField(null=True)
+    order                 = models.ForeignKey("Order", on_delete=models.SET_NULL, null=True)
+    created_at            = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "booking_tickets"
+        indexes  = [
+            models.Index(fields=['status', 'created_at'], name='booking_tickets_status_idx'),
+        ]
+
+    def to_dict(self):
+        return {
+            'ticket_id' : self.id,
+            'status'    : self.status,
+            'message'   : self.message,
+            'legs'      : self.leg_results,
+            'order_id'  : self.order_id
+        }
@@ -0,0 +1,142 @@
+import time
+import uuid
+import logging
+import threading
+from collections         import OrderedDict
+
+from django.db           import transaction, connection, close_old_connections
+
+from orders.models       import BookingTicket
+from orders.reservations import book, ReservationError
+from users.models        import User
+
+PIPELINE_WORKERS       = 2
+PIPELINE_BATCH_SIZE    = 50
+PIPELINE_QUEUE_SIZE    = 10000
+PIPELINE_POLL_INTERVAL = 1.0
+PIPELINE_ERROR_BACKOFF = 5.0
+
+TICKET_QUEUED  = 'queued'
+TICKET_SUCCESS = 'success'
+TICKET_FAILED  = 'failed'
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    pass
+
+class BookingPipeline:
+    """
+    Queued bookings live in booking_tickets, so every process can report on and work through any
+    ticket, and tickets still queued when a process stops are picked up by the next worker to poll.
+    Workers claim batches with SKIP LOCKED where the backend supports it, so several processes can
+    run workers side by side without booking a ticket twice.
+    """
+    def __init__(self, workers=PIPELINE_WORKERS, batch_size=PIPELINE_BATCH_SIZE, queue_size=PIPELINE_QUEUE_SIZE,
+            poll_interval=PIPELINE_POLL_INTERVAL, autostart=True):
+        self.workers       = workers
+        self.batch_size    = batch_size
+        self.queue_size    = queue_size
+        self.poll_interval = poll_interval
+        self.autostart     = autostart
+        self.wakeup        = threading.Event()
+        self.threads       = []
+        self.lock          = threading.Lock()
+
+    def submit(self, user, passenger_number, legs):
+        if BookingTicket.objects.filter(status=TICKET_QUEUED).count() >= self.queue_size:
+            raise QueueFull
+
+        ticket = BookingTicket.objects.create(
+                id               = uuid.uuid4().hex,
+                user             = user,
+                passenger_number = passenger_number,
+                legs             = legs,
+                status           = TICKET_QUEUED
+                )
+
+        if self.autostart:
+            transaction.on_commit(self.start)
+        return ticket
+
+    def ticket(self, ticket_id, user):
+        ticket = BookingTicket.objects.filter(id=ticket_id, user=user).first()
+        # A process that restarted with work outstanding resumes it as soon as anyone asks after it.
+        if ticket and ticket.status == TICKET_QUEUED and self.autostart:
+            self.start()
+        return ticket
+
+    def start(self):
+        with self.lock:
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.run, name='booking-pipeline', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            try:
+                if self.step():
+                    continue
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+            except Exception:
+                # Whatever broke, the claimed batch was rolled back to queued; back off and carry on.
+                logger.exception('booking pipeline batch failed')
+                time.sleep(PIPELINE_ERROR_BACKOFF)
+            finally:
+                close_old_connections()
+
+    def drain(self):
+        while self.step():
+            pass
+
+    def step(self):
+        with transaction.atomic():
+            # No select_related here: FOR UPDATE would lock the joined users rows too, holding up their
+            # sign-ins for the whole batch. Users are fetched with a plain read once the tickets are claimed.
+            tickets = BookingTicket.objects.filter(status=TICKET_QUEUED).order_by('created_at')
+            if connection.features.has_select_for_update_skip_locked:
+                tickets = tickets.select_for_update(skip_locked=True)
+            else:
+                tickets = tickets.select_for_update()
+
+            batch = list(tickets[:self.batch_size])
+            if batch:
+                users = User.objects.in_bulk({ticket.user_id for ticket in batch})
+                for ticket in batch:
+                    ticket.user = users[ticket.user_id]
+                self.process(batch)
+            return len(batch)
+
+    def process(self, batch):
+        groups = OrderedDict()
+        for ticket in batch:
+            groups.setdefault(frozenset(ticket.legs.values()), []).append(ticket)
+
+        # Tickets for the same schedules commit together, in arrival order; each booking
+        # runs in its own savepoint so a sold-out request does not undo the rest.
+        for tickets in groups.values():
+            results = []
+            try:
+                with transaction.atomic():
+                    for ticket in tickets:
+                        try:
+                            order = book(ticket.user, ticket.passenger_number, ticket.legs)
+                            results.append((ticket, TICKET_SUCCESS, TICKET_SUCCESS, None, order.id))
+                        except ReservationError as error:
+                            results.append((ticket, TICKET_FAILED, error.message, error.legs, None))
+            except Exception:
+                logger.exception('booking pipeline group failed')
+                results = [(ticket, TICKET_FAILED, 'server_error', None, None) for ticket in tickets]
+
+            for ticket, status, message, leg_results, order_id in results:
+                ticket.message     = message
+                ticket.leg_results = leg_results
+                ticket.order_id    = order_id
+                ticket.status      = status
+                ticket.save(update_fields=['message', 'leg_results', 'order', 'status'])
+
+booking_pipeline = BookingPipeline()
@@ -0,0 +1,302 @@
+import datetime
+from collections      import Counter
+
+from django.conf      import settings
+from django.db        import transaction, connection
+from django.db.models import F, Q, Sum, Case, When, Value, IntegerField
+
+from orders.models    import Order, ScheduleOrder, SeatHold, Passenger, WaitlistEntry
+from taxis.models     import Schedule
+from taxis.signals    import seats_changed
+
+STATUS_BOOK     = 1
+STATUS_FINISHED = 2
+STATUS_CANCLED  = 3
+TAX             = 8800
+
+LEG_SUCCESS        = 'success'
+LEG_INVALID_ID     = 'invalid_id'
+LEG_NO_SEAT_REMAIN = 'no_seat_remain'
+LEG_INVALID_HOLD   = 'invalid_hold'
+
+HOLD_SWEEP_BATCH_SIZE   = 500
+BULK_BOOKING_MAX_ORDERS = 100
+
+class SeatShortage(Exception):
+    pass
+
+class ExceedsCapacity(Exception):
+    pass
+
+class ReservationError(Exception):
+    def __init__(self, legs):
+        super().__init__(legs)
+        self.legs = legs
+
+    @property
+    def message(self):
+        for message in (LEG_INVALID_ID, LEG_INVALID_HOLD):
+            if message in self.legs.values():
+                return message
+        return LEG_NO_SEAT_REMAIN
+
+def reserve_seats(seats):
+    # Must run inside the caller's transaction: a shortage leaves partial decrements to be rolled back.
+    seats = {schedule_id: count for schedule_id, count in seats.items() if count}
+    if not seats:
+        return
+
+    condition = Q()
+    for schedule_id, count in seats.items():
+        condition |= Q(id=schedule_id, seat_remain__gte=count, closed=False)
+
+    updated = Schedule.objects.filter(condition).update(
+            seat_remain = F('seat_remain') - Case(
+                *[When(id=schedule_id, then=Value(count)) for schedule_id, count in seats.items()],
+                output_field = IntegerField()
+                )
+            )
+    if updated != len(seats):
+        raise SeatShortage
+
+    seats_changed.send(sender=Schedule, schedule_ids=seats.keys())
+
+def release_seats(seats):
+    # A closed schedule stays at zero seats, whatever is handed back to it.
+    seats = {schedule_id: count for schedule_id, count in seats.items() if count}
+    if not seats:
+        return
+
+    Schedule.objects.filter(id__in=seats.keys(), closed=False).update(
+            seat_remain = F('seat_remain') + Case(
+                *[When(id=schedule_id, then=Value(count)) for schedule_id, count in seats.items()],
+                output_field = IntegerField()
+                )
+            )
+    seats_changed.send(sender=Schedule, schedule_ids=seats.keys())
+
+def seat_failures(legs, seats):
+    seat_remain = dict(Schedule.objects.filter(id__in=seats.keys()).values_list('id', 'seat_remain'))
+
+    failures = {}
+    for leg, schedule_id in legs.items():
+        if schedule_id not in seat_remain:
+            failures[leg] = LEG_INVALID_ID
+        elif seat_remain[schedule_id] < seats[schedule_id]:
+            failures[leg] = LEG_NO_SEAT_REMAIN
+        else:
+            failures[leg] = LEG_SUCCESS
+    return failures
+
+def book(user, passenger_number, legs):
+    seats = Counter()
+    for schedule_id in legs.values():
+        seats[schedule_id] += passenger_number
+
+    try:
+        with transaction.atomic():
+            reserve_seats(seats)
+
+            order = Order.objects.create(user=user, status_id=STATUS_BOOK)
+            ScheduleOrder.objects.bulk_create([
+                ScheduleOrder(
+                    order            = order,
+                    schedule_id      = schedule_id,
+                    tax              = TAX,
+                    passenger_number = passenger_number
+                    ) for schedule_id in legs.values() ])
+    except SeatShortage:
+        raise ReservationError(seat_failures(legs, seats))
+
+    return order
+
+def create_orders(user, count):
+    # Backends that cannot hand back primary keys from a multi-row INSERT get one INSERT per order.
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Order.objects.bulk_create([Order(user=user, status_id=STATUS_BOOK) for _ in range(count)])
+    return [Order.objects.create(user=user, status_id=STATUS_BOOK) for _ in range(count)]
+
+def book_many(user, bookings):
+    """
+    Book several orders in one transaction. Each booking is a dict with passenger_number, legs and
+    passengers (Passenger field values). All seats are reserved with one conditional UPDATE; failures
+    are reported per leg as '<index>.<leg>'.
+    """
+    seats = Counter()
+    legs  = {}
+    for index, booking in enumerate(bookings):
+        for leg, schedule_id in booking['legs'].items():
+            seats[schedule_id] += booking['passenger_number']
+            legs['{}.{}'.format(index, leg)] = schedule_id
+
+    try:
+        with transaction.atomic():
+            reserve_seats(seats)
+
+            orders = create_orders(user, len(bookings))
+            ScheduleOrder.objects.bulk_create([
+                ScheduleOrder(
+                    order            = order,
+                    schedule_id      = schedule_id,
+                    tax              = TAX,
+                    passenger_number = booking['passenger_number']
+                    ) for order, booking in zip(orders, bookings) for schedule_id in booking['legs'].values() ])
+            Passenger.objects.bulk_create([
+                Passenger(order=order, **passenger)
+                for order, booking in zip(orders, bookings) for passenger in booking['passengers'] ])
+    except SeatShortage:
+        raise ReservationError(seat_failures(legs, seats))
+
+    return orders
+
+def schedule_capacity(schedule):
+    # Seats still for sale plus every seat that can come back to it from an active order or a hold.
+    booked = ScheduleOrder.objects.filter(schedule_id=schedule.id).exclude(order__status_id=STATUS_CANCLED)\
+            .aggregate(seats=Sum('passenger_number'))['seats']
+    held   = SeatHold.objects.filter(schedule_id=schedule.id).aggregate(seats=Sum('passenger_number'))['seats']
+    return schedule.seat_remain + (booked or 0) + (held or 0)
+
+def join_waitlist(user, schedule_id, passenger_number):
+    with transaction.atomic():
+        schedule = Schedule.objects.select_for_update().get(id=schedule_id, closed=False)
+        if schedule.seat_remain >= passenger_number:
+            return None
+        # Promotion is strict FIFO, so a request that can never fit would block everyone behind it.
+        if passenger_number > schedule_capacity(schedule):
+            raise ExceedsCapacity
+        return WaitlistEntry.objects.create(schedule=schedule, user=user, passenger_number=passenger_number)
+
+def waitlist_position(entry):
+    return WaitlistEntry.objects.filter(schedule_id=entry.schedule_id, id__lte=entry.id).count()
+
+def promote_waitlist(schedule_ids):
+    # Strict FIFO: walk each schedule's queue head-first on the (schedule, id) index and stop at the
+    # first request that no longer fits, so a large party is never overtaken by later small ones.
+    promoted = []
+    for schedule_id in Schedule.objects.filter(id__in=schedule_ids, closed=False).order_by('id').values_list('id', flat=True):
+        while True:
+            # Lock the entry alone; joining users here would lock the waiting user's row as well.
+            entry = WaitlistEntry.objects.select_for_update().filter(schedule_id=schedule_id).order_by('id').first()
+            if entry is None:
+                break
+            try:
+                promoted.append(book(entry.user, entry.passenger_number, {'going': schedule_id}))
+            except ReservationError:
+                break
+            entry.delete()
+    return promoted
+
+def cancel_orders(orders, promote=True):
+    # Orders are marked cancelled rather than deleted so the ?since= sync can report them; their
+    # legs stay behind for that report but no longer count against the schedule.
+    with transaction.atomic():
+        order_ids = list(orders.exclude(status_id=STATUS_CANCLED).select_for_update().values_list('id', flat=True))
+        if not order_ids:
+            return 0
+
+        seats = dict(
+                ScheduleOrder.objects.filter(order_id__in=order_ids)
+                .values('schedule_id')
+                .annotate(seats=Sum('passenger_number'))
+                .values_list('schedule_id', 'seats')
+                )
+        Order.objects.filter(id__in=order_ids).update(status_id=STATUS_CANCLED, updated_at=datetime.datetime.now())
+        release_seats(seats)
+        if promote:
+            promote_waitlist(seats.keys())
+
+    return len(order_ids)
+
+def cancel_schedule(schedule_id, close=False):
+    # The departure is not running, so the freed seats are never offered to the waitlist.
+    with transaction.atomic():
+        schedule  = Schedule.objects.select_for_update().get(id=schedule_id)
+        cancelled = cancel_orders(Order.objects.filter(
+            id__in = ScheduleOrder.objects.filter(schedule_id=schedule.id).values('order_id')
+            ), promote=False)
+        if close:
+            # Holds and waitlist entries would otherwise hand seats back, or take them, after closing.
+            SeatHold.objects.filter(schedule_id=schedule.id).delete()
+            WaitlistEntry.objects.filter(schedule_id=schedule.id).delete()
+            Schedule.objects.filter(id=schedule.id).update(seat_remain=0, closed=True)
+            seats_changed.send(sender=Schedule, schedule_ids=[schedule.id])
+
+    return cancelled
+
+def place_hold(user, schedule_id, passenger_number, ttl=None):
+    ttl   = settings.SEAT_HOLD_TTL if ttl is None else ttl
+    seats = {schedule_id: passenger_number}
+
+    try:
+        with transaction.atomic():
+            reserve_seats(seats)
+            return SeatHold.objects.create(
+                    schedule_id      = schedule_id,
+                    user             = user,
+                    passenger_number = passenger_number,
+                    expires_at       = datetime.datetime.now() + datetime.timedelta(seconds=ttl)
+                    )
+    except SeatShortage:
+        raise ReservationError(seat_failures({'hold': schedule_id}, seats))
+
+def release_hold(user, hold_id):
+    with transaction.atomic():
+        hold = SeatHold.objects.select_for_update().get(id=hold_id, user=user)
+        hold.delete()
+        release_seats({hold.schedule_id: hold.passenger_number})
+        promote_waitlist([hold.schedule_id])
+
+def book_holds(user, legs):
+    with transaction.atomic():
+        holds = {
+                hold.id: hold for hold in SeatHold.objects.select_for_update().filter(
+                    id__in         = legs.values(),
+                    user           = user,
+                    expires_at__gt = datetime.datetime.now()
+                    ) }
+
+        failures = {leg: LEG_SUCCESS if hold_id in holds else LEG_INVALID_HOLD for leg, hold_id in legs.items()}
+        if LEG_INVALID_HOLD in failures.values():
+            raise ReservationError(failures)
+
+        order = Order.objects.create(user=user, status_id=STATUS_BOOK)
+        ScheduleOrder.objects.bulk_create([
+            ScheduleOrder(
+                order            = order,
+                schedule_id      = holds[hold_id].schedule_id,
+                tax              = TAX,
+                passenger_number = holds[hold_id].passenger_number
+                ) for hold_id in legs.values() ])
+        SeatHold.objects.filter(id__in=holds.keys()).delete()
+
+    return order
+
+def release_expired_holds(now=None, batch_size=HOLD_SWEEP_BATCH_SIZE):
+    now      = now or datetime.datetime.now()
+    released = 0
+
+    while True:
+        with transaction.atomic():
+            # Walk the expires_at index oldest-first; skip holds another sweeper or checkout has locked.
+            hold_ids = list(
+                    SeatHold.objects.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+                    .filter(expires_at__lte=now)
+                    .order_by('expires_at')
+                    .values_list('id', flat=True)[:batch_size]
+                    )
+            if not hold_ids:
+                return released
+
+            seats = dict(
+                    SeatHold.objects.filter(id__in=hold_ids)
+                    .values('schedule_id')
+                    .annotate(seats=Sum('passenger_number'))
+                    .values_list('schedule_id', 'seats')
+                    )
+            SeatHold.objects.filter(id__in=hold_ids).delete()
+            release_seats(seats)
+            promote_waitlist(seats.keys())
+
+        released += len(hold_ids)
+        if len(hold_ids) < batch_size:
+            return released
@@ -1,17 +1,31 @@
 import json
+import base64
 import bcrypt
 import datetime
-
-from django.test   import TestCase, Client
-
-from taxis.models  import TaxiCompany, TaxiDriver, Course, Schedule, Location, SeatType
-from users.models  import User
-from orders.models import Order, ScheduleOrder, Status
+from io                  import StringIO
+from unittest            import mock
+
+from django.test         import TestCase, TransactionTestCase, Client
+from django.core.management import call_command
+from django.db           import connection
+from django.test.utils   import CaptureQueriesContext
+
+from taxis.models        import TaxiCompany, TaxiDriver, Course, Schedule, Location, SeatType, ScheduleSearchRow
+from users.models        import User
+from users.cache         import user_cache
+from orders.models       import Order, ScheduleOrder, Status, SeatHold, Passenger, WaitlistEntry, BookingTicket
+from orders.reservations import place_hold, release_hold, release_expired_holds, release_seats, join_waitlist
+from orders.idempotency  import idempotency_store
+from orders.pipeline     import booking_pipeline
+from orders.history      import order_history
+from taxis.search        import search_index
 
 test_date = datetime.datetime.now()
 
 class OrderTest(TestCase):
     def setUp(self):
+        user_cache.clear()
+
         password = bcrypt.hashpw(
                 'P@ssw0rd'.encode('utf-8'),
                 bcrypt.gensalt()
@@ -78,6 +92,11 @@ class OrderTest(TestCase):
                 name = 'test'
         )
 
+        Status.objects.create(
+                id   = 3,
+                name = 'canceled'
+        )
+
         order = Order.objects.create(
                 id         = 1,
                 user       = user,
@@ -212,10 +231,78 @@ class OrderTest(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json(), 
                 {
-                    'message': 'invalid_id'
+                    'message': 'invalid_id',
+                    'legs'   : {
+                        'going'  : 'invalid_id',
+                        'coming' : 'invalid_id'
+                    }
                 }
         )
 
+    def test_order_post_no_seat_remain(self):
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization': access_token,
+                'content_type': 'application/json'
+        }
+
+        data = {
+                'passenger_number'   : 6,
+                'going_schedule_id'  : 1,
+                'coming_schedule_id' : 1
+        }
+
+        response = client.post('/orders', json.dumps(data), **headers)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), 
+                {
+                    'message': 'no_seat_remain',
+                    'legs'   : {
+                        'going'  : 'no_seat_remain',
+                        'coming' : 'no_seat_remain'
+                    }
+                }
+        )
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 10)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_order_post_reserves_atomically(self):
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization': access_token,
+                'content_type': 'application/json'
+        }
+
+        data = {
+                'passenger_number'   : 5,
+                'going_schedule_id'  : 1,
+                'coming_schedule_id' : 1
+        }
+
+        response = client.post('/orders', json.dumps(data), **headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 0)
+        self.assertEqual(ScheduleSearchRow.objects.get(schedule_id=1).seat_remain, 0)
+        self.assertEqual(ScheduleOrder.objects.filter(passenger_number=5).count(), 2)
+
     def test_order_delete_success(self):
         client = Client()
 
@@ -263,3 +350,427 @@ class OrderTest(TestCase):
                     'message': 'invalid_id'
                 }
         )
+
+    def test_hold_converts_to_order(self):
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization': access_token,
+                'content_type': 'application/json'
+        }
+
+        hold = client.post('/orders/holds', json.dumps({'schedule_id': 1, 'passenger_number': 3}), **headers)
+
+        self.assertEqual(hold.status_code, 201)
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 7)
+
+        response = client.post('/orders', json.dumps({'going_hold_id': hold.json()['hold_id']}), **headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 7)
+        self.assertEqual(ScheduleOrder.objects.filter(passenger_number=3).count(), 1)
+        self.assertFalse(SeatHold.objects.exists())
+
+        response = client.post('/orders', json.dumps({'going_hold_id': hold.json()['hold_id']}), **headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'invalid_hold', 'legs': {'going': 'invalid_hold'}})
+
+    def test_expired_holds_released(self):
+        now  = datetime.datetime.now()
+        user = User.objects.get(id=1)
+
+        place_hold(user, 1, 2)
+        place_hold(user, 1, 3, ttl=-1)
+        place_hold(user, 1, 4, ttl=-1)
+
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 1)
+        self.assertEqual(release_expired_holds(now, batch_size=1), 2)
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 8)
+        self.assertEqual(list(SeatHold.objects.values_list('passenger_number', flat=True)), [2])
+
+    def test_order_post_idempotent(self):
+        idempotency_store.clear()
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization'    : access_token,
+                'HTTP_Idempotency_Key'  : 'order-1',
+                'content_type'          : 'application/json'
+        }
+
+        data = {
+                'passenger_number'   : 2,
+                'going_schedule_id'  : 1
+        }
+
+        first  = client.post('/orders', json.dumps(data), **headers)
+        second = client.post('/orders', json.dumps(data), **headers)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 8)
+        self.assertEqual(Order.objects.count(), 2)
+
+        response = client.post('/orders', json.dumps(dict(data, passenger_number=1)), **headers)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json(), {'message': 'idempotency_key_reused'})
+
+        response = client.post('/orders/bulk', json.dumps({'orders': [data]}), **headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 6)
+
+    def test_order_post_queued(self):
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization': access_token,
+                'content_type': 'application/json'
+        }
+
+        with mock.patch.object(booking_pipeline, 'autostart', False):
+            first  = client.post('/orders', json.dumps({'passenger_number': 6, 'going_schedule_id': 1, 'async': True}), **headers)
+            second = client.post('/orders', json.dumps({'passenger_number': 6, 'going_schedule_id': 1, 'async': True}), **headers)
+
+            self.assertEqual(first.status_code, 202)
+            self.assertEqual(client.get('/orders/tickets/' + first.json()['ticket_id'], **headers).json()['ticket']['status'], 'queued')
+
+        booking_pipeline.drain()
+
+        first  = client.get('/orders/tickets/' + first.json()['ticket_id'], **headers).json()['ticket']
+        second = client.get('/orders/tickets/' + second.json()['ticket_id'], **headers).json()['ticket']
+
+        self.assertEqual(first['status'], 'success')
+        self.assertEqual(second['status'], 'failed')
+        self.assertEqual(second['legs'], {'going': 'no_seat_remain'})
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 4)
+        self.assertEqual(client.get('/orders/tickets/unknown', **headers).status_code, 400)
+
+    def test_order_post_queued_unexpected_error(self):
+        user = User.objects.get(id=1)
+
+        with mock.patch.object(booking_pipeline, 'autostart', False):
+            ticket = booking_pipeline.submit(user, 2, {'going': 1})
+
+        with mock.patch('orders.pipeline.book', side_effect=RuntimeError), self.assertLogs('orders.pipeline', 'ERROR'), \
+                CaptureQueriesContext(connection) as queries:
+            booking_pipeline.drain()
+
+        # The claim must not join users, or FOR UPDATE would lock their rows for the whole batch.
+        claims = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and 'FROM "booking_tickets"' in query['sql']]
+        self.assertTrue(claims)
+        self.assertFalse([sql for sql in claims if 'JOIN' in sql])
+
+        ticket = BookingTicket.objects.get(id=ticket.id)
+        self.assertEqual((ticket.status, ticket.message), ('failed', 'server_error'))
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 10)
+        self.assertEqual(booking_pipeline.ticket(ticket.id, user), ticket)
+
+    def test_order_history_single_query(self):
+        user     = User.objects.get(id=1)
+        schedule = Schedule.objects.get(id=1)
+        for _ in range(5):
+            order = Order.objects.create(user=user, status_id=1)
+            ScheduleOrder.objects.create(schedule=schedule, order=order, passenger_number=2, tax=0)
+
+        with self.assertNumQueries(1):
+            results, next_cursor = order_history(user)
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual([result['round_trip'] for result in results].count('편도'), 5)
+        self.assertEqual(results[-1]['order_id'], 1)
+
+    def test_order_get_paginated(self):
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization': access_token,
+                'content_type': 'application/json'
+        }
+
+        for _ in range(2):
+            client.post('/orders', json.dumps({'passenger_number': 1, 'going_schedule_id': 1}), **headers)
+
+        first = client.get('/orders?limit=2', **headers).json()
+        last  = client.get('/orders?limit=2&cursor=' + first['next_cursor'], **headers).json()
+
+        self.assertEqual(len(first['result']), 2)
+        self.assertEqual([result['order_id'] for result in last['result']], [1])
+        self.assertIsNone(last['next_cursor'])
+        self.assertEqual(client.get('/orders?cursor=bogus', **headers).status_code, 400)
+
+        cursor = base64.urlsafe_b64encode(json.dumps(['created_at', '2021-01-01T00:00+09:00', 1]).encode('utf-8')).decode('utf-8')
+        self.assertEqual(client.get('/orders?cursor=' + cursor, **headers).json(), {'message': 'invalid_cursor'})
+
+        sync = client.get('/orders?since=', **headers).json()
+        self.assertEqual(len(sync['result']), 3)
+
+        Order.objects.filter(id=1).first().save()
+        sync = client.get('/orders?since=' + sync['next_since'], **headers).json()
+        self.assertEqual([result['order_id'] for result in sync['result']], [1])
+
+        sync = client.get('/orders?since=' + sync['next_since'], **headers).json()
+        self.assertEqual(sync['result'], [])
+
+    def test_order_changes_report_cancellation(self):
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization': access_token,
+                'content_type': 'application/json'
+        }
+
+        sync = client.get('/orders?since=', **headers).json()
+        self.assertEqual([(result['order_id'], result['cancelled']) for result in sync['result']], [(1, False)])
+
+        response = client.delete('/orders/1', **headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 12)
+
+        sync = client.get('/orders?since=' + sync['next_since'], **headers).json()
+
+        self.assertEqual([(result['order_id'], result['cancelled']) for result in sync['result']], [(1, True)])
+        self.assertEqual(client.get('/orders', **headers).json(), {'result': []})
+        self.assertEqual(client.delete('/orders/1', **headers).json(), {'message': 'invalid_id'})
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 12)
+
+    def test_operator_cancels_schedule(self):
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization': access_token,
+                'content_type': 'application/json'
+        }
+
+        client.post('/orders', json.dumps({'passenger_number': 4, 'going_schedule_id': 1}), **headers)
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 6)
+
+        response = client.post('/orders/schedules/1/cancel', **headers)
+        self.assertEqual(response.status_code, 403)
+
+        operator             = User.objects.get(id=1)
+        operator.is_operator = True
+        operator.save()
+
+        waiter = User.objects.create(name='waiter', email='waiter@example.com', password='')
+        join_waitlist(waiter, 1, 8)
+
+        response = client.post('/orders/schedules/1/cancel', **headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'message': 'success', 'cancelled_orders': 2})
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 12)
+        self.assertEqual(ScheduleSearchRow.objects.get(schedule_id=1).seat_remain, 12)
+        self.assertFalse(Order.objects.exclude(status_id=3).exists())
+        self.assertTrue(WaitlistEntry.objects.filter(user=waiter).exists())
+
+        place_hold(operator, 1, 4, ttl=-1)
+        join_waitlist(operator, 1, 10)
+
+        response = client.post('/orders/schedules/1/cancel', json.dumps({'close': True}), **headers)
+
+        self.assertEqual(response.json(), {'message': 'success', 'cancelled_orders': 0})
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 0)
+        self.assertTrue(Schedule.objects.get(id=1).closed)
+        self.assertTrue(ScheduleSearchRow.objects.get(schedule_id=1).closed)
+        self.assertEqual(search_index.route('test', 'test', Schedule.objects.get(id=1).date), [])
+        self.assertFalse(SeatHold.objects.exists())
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+        release_seats({1: 4})
+        self.assertEqual(release_expired_holds(), 0)
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 0)
+        self.assertEqual(client.post('/orders', json.dumps({'passenger_number': 1, 'going_schedule_id': 1}), **headers).status_code, 401)
+
+    def test_bulk_order_post(self):
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization': access_token,
+                'content_type': 'application/json'
+        }
+
+        passenger = {
+                'last_name'   : 'Kim',
+                'first_name'  : 'Minsu',
+                'gender'      : 'M',
+                'nationality' : 'KR',
+                'birth_date'  : '2010-03-01'
+        }
+
+        data = {
+                'orders': [
+                    {'going_schedule_id': 1, 'coming_schedule_id': 1, 'passengers': [passenger, passenger]},
+                    {'going_schedule_id': 1, 'passenger_number': 3}
+                ]
+        }
+
+        response = client.post('/orders/bulk', json.dumps(data), **headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['order_ids']), 2)
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 3)
+        self.assertEqual(ScheduleOrder.objects.filter(order_id__in=response.json()['order_ids']).count(), 3)
+        self.assertEqual(Passenger.objects.filter(order_id=response.json()['order_ids'][0]).count(), 2)
+
+        response = client.post('/orders/bulk', json.dumps(data), **headers)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['legs'], {'0.going': 'no_seat_remain', '0.coming': 'no_seat_remain', '1.going': 'no_seat_remain'})
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 3)
+        self.assertEqual(Order.objects.count(), 3)
+
+        response = client.post('/orders/bulk', json.dumps({'orders': [{'going_schedule_id': 'x', 'passenger_number': 1}]}), **headers)
+
+        self.assertEqual(response.json(), {'message': 'invalid_input'})
+
+    def test_waitlist_promoted_on_cancel(self):
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization': access_token,
+                'content_type': 'application/json'
+        }
+
+        response = client.post('/orders/waitlist', json.dumps({'schedule_id': 1, 'passenger_number': 2}), **headers)
+        self.assertEqual(response.json(), {'message': 'seat_available'})
+
+        client.post('/orders', json.dumps({'passenger_number': 10, 'going_schedule_id': 1}), **headers)
+        order_id = Order.objects.latest('id').id
+
+        waiter = User.objects.create(name='waiter', email='waiter@example.com', password='')
+        first  = client.post('/orders/waitlist', json.dumps({'schedule_id': 1, 'passenger_number': 6}), **headers)
+        WaitlistEntry.objects.create(schedule_id=1, user=waiter, passenger_number=1)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(first.json()['position'], 1)
+        self.assertEqual(client.post('/orders/waitlist', json.dumps({'schedule_id': 1, 'passenger_number': 6}), **headers).json(),
+                {'message': 'already_exists'})
+
+        response = client.delete('/orders/{}'.format(order_id), **headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 3)
+        self.assertEqual(ScheduleOrder.objects.filter(order__user=waiter, passenger_number=1).count(), 1)
+        self.assertEqual(ScheduleOrder.objects.filter(order__user_id=1, passenger_number=6).count(), 1)
+
+    def test_waitlist_rejects_entries_beyond_capacity(self):
+        client = Client()
+
+        user = {
+                'email': 'user@example.com',
+                'password': 'P@ssw0rd'
+        }
+
+        access_token = client.post('/users/signin', json.dumps(user), content_type='application/json').json().get('access_token')
+
+        headers = {
+                'HTTP_Authorization': access_token,
+                'content_type': 'application/json'
+        }
+
+        client.post('/orders', json.dumps({'passenger_number': 8, 'going_schedule_id': 1}), **headers)
+        place_hold(User.objects.get(id=1), 1, 2)
+
+        response = client.post('/orders/waitlist', json.dumps({'schedule_id': 1, 'passenger_number': 13}), **headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'exceeds_capacity'})
+
+        response = client.post('/orders/waitlist', json.dumps({'schedule_id': 1, 'passenger_number': 12}), **headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(WaitlistEntry.objects.get().passenger_number, 12)
+
+    def test_waitlist_promoted_on_hold_release(self):
+        user     = User.objects.get(id=1)
+        waiter   = User.objects.create(name='waiter', email='waiter@example.com', password='')
+        expiring = place_hold(user, 1, 4, ttl=-1)
+        released = place_hold(user, 1, 6)
+        WaitlistEntry.objects.create(schedule_id=1, user=waiter, passenger_number=3)
+        WaitlistEntry.objects.create(schedule_id=1, user=user, passenger_number=5)
+
+        self.assertEqual(release_expired_holds(), 1)
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 1)
+        self.assertEqual(ScheduleOrder.objects.filter(order__user=waiter, passenger_number=3).count(), 1)
+
+        release_hold(user, released.id)
+
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertFalse(SeatHold.objects.filter(id=expiring.id).exists())
+        self.assertEqual(Schedule.objects.get(id=1).seat_remain, 2)
+        self.assertEqual(ScheduleOrder.objects.filter(order__user=user, passenger_number=5).count(), 1)
+
+class BenchmarkBookingTest(TransactionTestCase):
+    # Client threads use their own connections, so the seeded rows have to be committed.
+    def test_benchmark_booking_command(self):
+        output = StringIO()
+        call_command('benchmark_booking', clients=2, iterations=3, locations=3, cancel_rate=0.5, stdout=output)
+
+        self.assertIn('signin: n 2', output.getvalue())
+        self.assertIn('seat conservation holds', output.getvalue())
+        self.assertFalse(Schedule.objects.exists())
+        self.assertFalse(User.objects.exists())
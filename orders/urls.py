@@ -1,8 +1,15 @@
 from django.urls import path
 
-from orders.views import BookView
+from orders.views import BookView, BulkBookView, HoldView, WaitlistView, BookingTicketView, ScheduleCancelView
 
 urlpatterns = [
     path('', BookView.as_view()),
     path('/<int:order_id>', BookView.as_view()),
+    path('/bulk', BulkBookView.as_view()),
+    path('/holds', HoldView.as_view()),
+    path('/holds/<int:hold_id>', HoldView.as_view()),
+    path('/waitlist', WaitlistView.as_view()),
+    path('/waitlist/<int:waitlist_id>', WaitlistView.as_view()),
+    path('/tickets/<str:ticket_id>', BookingTicketView.as_view()),
+    path('/schedules/<int:schedule_id>/cancel', ScheduleCancelView.as_view()),
 ]
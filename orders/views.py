@@ -1,81 +1,87 @@
 import json
+import datetime
 
-from django.http       import JsonResponse
-from django.views      import View
+from django.http         import JsonResponse
+from django.views        import View
+from django.db           import IntegrityError
 
-from decorators        import validate_login
-from orders.models     import Order, Status, ScheduleOrder
-from taxis.models      import Schedule
-
-STATUS_BOOK     = 1
-STATUS_FINISHED = 2
-STATUS_CANCLED  = 3
-TAX             = 8800
+from decorators          import validate_login
+from orders.models       import Order, SeatHold, WaitlistEntry
+from taxis.models        import Schedule
+from orders.history      import order_history, order_changes, InvalidCursor, ORDER_HISTORY_MAX_LIMIT
+from orders.idempotency  import idempotent
+from orders.pipeline     import booking_pipeline, QueueFull
+from orders.reservations import STATUS_CANCLED, book, book_many, book_holds, cancel_orders, cancel_schedule, join_waitlist, waitlist_position, ExceedsCapacity, place_hold, release_hold, ReservationError, LEG_NO_SEAT_REMAIN, BULK_BOOKING_MAX_ORDERS
 
 class BookView(View):
     @validate_login
+    @idempotent
     def post(self, request):
         try:
             data               = json.loads(request.body)
             passenger_number   = data.get('passenger_number', None)
             going_schedule_id  = data.get('going_schedule_id', None)
             coming_schedule_id = data.get('coming_schedule_id', None)
+            going_hold_id      = data.get('going_hold_id', None)
+            coming_hold_id     = data.get('coming_hold_id', None)
             user               = request.user
-            
-            schedule_ids = [ schedule_id for schedule_id in (going_schedule_id, coming_schedule_id) if schedule_id ]
 
-            for schedule_id in schedule_ids:
-                if passenger_number > Schedule.objects.get(id=schedule_id).seat_remain:
-                    return JsonResponse({'message': 'no_seat_remain'}, status=401)
+            if going_hold_id or coming_hold_id:
+                holds = { leg: hold_id for leg, hold_id in (('going', going_hold_id), ('coming', coming_hold_id)) if hold_id }
+
+                if any(type(hold_id) is not int for hold_id in holds.values()) or going_hold_id == coming_hold_id:
+                    return JsonResponse({'message': 'invalid_input'}, status=400)
+
+                book_holds(user, holds)
+
+                return JsonResponse({'message': 'success'}, status=201)
+
+            legs = { leg: schedule_id for leg, schedule_id in (('going', going_schedule_id), ('coming', coming_schedule_id)) if schedule_id }
 
-            order = Order.objects.create(user=user, status_id=STATUS_BOOK)
+            if not legs:
+                return JsonResponse({'message': 'key_error'}, status=400)
 
-            for schedule_id in schedule_ids:
-                schedule_orders = ScheduleOrder.objects.create(
-                        order            = order,
-                        schedule_id      = schedule_id,
-                        tax              = TAX,
-                        passenger_number = passenger_number
-                        ) 
+            if type(passenger_number) is not int or passenger_number < 1 \
+                    or any(type(schedule_id) is not int for schedule_id in legs.values()):
+                return JsonResponse({'message': 'invalid_input'}, status=400)
 
-                schedule  = Schedule.objects.get(id=schedule_id)
-                schedule.seat_remain -= passenger_number
-                schedule.save()
+            if data.get('async'):
+                ticket = booking_pipeline.submit(user, passenger_number, legs)
+                return JsonResponse({'message': 'queued', 'ticket_id': ticket.id}, status=202)
+
+            book(user, passenger_number, legs)
 
             return JsonResponse({'message': 'success'}, status=201)
         except json.decoder.JSONDecodeError:
             return JsonResponse({'message': 'no_body'}, status=400)
-        except KeyError:
-            return JsonResponse({'message': 'key_error'}, status=400)
-        except Schedule.DoesNotExist:
-            return JsonResponse({'message': 'invalid_id'}, status=400)
+        except ReservationError as error:
+            status = 401 if error.message == LEG_NO_SEAT_REMAIN else 400
+            return JsonResponse({'message': error.message, 'legs': error.legs}, status=status)
+        except QueueFull:
+            return JsonResponse({'message': 'queue_full'}, status=503)
 
     @validate_login
     def get(self, request):
         try:
-            user   = request.user
-            orders = Order.objects.filter(user=user).prefetch_related('scheduleorder_set__schedule__course').order_by('-created_at')
-            
-            results = [
-                    {
-                        'order_id'                 : order.id,
-                        'round_trip'               : '왕복' if order.scheduleorder_set.count() == 2 else '편도',
-                        'departure_location'       : order.scheduleorder_set.all()[0].schedule.course.departure_location.name,
-                        'departure_location_code'  : order.scheduleorder_set.all()[0].schedule.course.departure_location.location_code,
-                        'arrival_location'         : order.scheduleorder_set.all()[0].schedule.course.arrival_location.name,
-                        'arrival_location_code'   : order.scheduleorder_set.all()[0].schedule.course.arrival_location.location_code,
-                        'departure_date'           : order.scheduleorder_set.all()[0].schedule.date.strftime('%m-%d'),
-                        'comeback_date'            : order.scheduleorder_set.all()[1].schedule.date.strftime('%m-%d') if order.scheduleorder_set.count() == 2 else None,
-                        'passenger_number'         : order.scheduleorder_set.all()[0].passenger_number,
-                        'going_taxi_company_name'  : order.scheduleorder_set.all()[0].schedule.course.taxi_company.name,
-                        'going_taxi_company_logo'  : order.scheduleorder_set.all()[0].schedule.course.taxi_company.logo_url,
-                        'going_price'              : order.scheduleorder_set.all()[0].schedule.price,
-                        'coming_taxi_company_name' : order.scheduleorder_set.all()[1].schedule.course.taxi_company.name if order.scheduleorder_set.count() == 2 else None,
-                        'coming_taxi_company_logo' : order.scheduleorder_set.all()[1].schedule.course.taxi_company.logo_url if order.scheduleorder_set.count() == 2 else None,
-                        'coming_price'             : order.scheduleorder_set.all()[1].schedule.price if order.scheduleorder_set.count() == 2 else None
-                    } for order in orders ]
-
-            return JsonResponse({'result': results}, status=200)
+            limit = request.GET.get('limit')
+            limit = min(int(limit), ORDER_HISTORY_MAX_LIMIT) if limit else None
+            if limit is not None and limit < 1:
+                raise ValueError
+
+            if 'since' in request.GET:
+                results, next_since = order_changes(request.user, request.GET['since'], limit)
+                return JsonResponse({'result': results, 'next_since': next_since}, status=200)
+
+            results, next_cursor = order_history(request.user, limit, request.GET.get('cursor'))
+
+            total_result = {'result': results}
+            if limit is not None:
+                total_result['next_cursor'] = next_cursor
+            return JsonResponse(total_result, status=200)
+        except ValueError:
+            return JsonResponse({'message': 'invalid_limit'}, status=400)
+        except InvalidCursor:
+            return JsonResponse({'message': 'invalid_cursor'}, status=400)
         except IndexError:
             return JsonResponse({'message': 'data_error'}, status=400)
 
@@ -83,22 +89,145 @@ class BookView(View):
     @validate_login
     def delete(self, request, order_id):
         try:
-            user = request.user
-            
-            order = Order.objects.get(id=order_id)
-            if order.user_id != user.id:
+            order = Order.objects.exclude(status_id=STATUS_CANCLED).get(id=order_id)
+            if order.user_id != request.user.id:
                 return JsonResponse({'message': 'invalid_user'}, status=400)
 
-            schedule_orders = order.scheduleorder_set.all()
+            cancel_orders(Order.objects.filter(id=order.id))
+
+            return JsonResponse({'message': 'success'}, status=201)
+        except Order.DoesNotExist:
+            return JsonResponse({'message': 'invalid_id'}, status=400)
+
+class BulkBookView(View):
+    PASSENGER_FIELDS = ('last_name', 'first_name', 'gender', 'nationality', 'birth_date')
+
+    def parse_booking(self, order):
+        legs       = { leg: order.get(leg + '_schedule_id') for leg in ('going', 'coming') if order.get(leg + '_schedule_id') }
+        passengers = [
+                {field: passenger[field] for field in self.PASSENGER_FIELDS}
+                for passenger in order.get('passengers', []) ]
+
+        for passenger in passengers:
+            if any(type(passenger[field]) is not str for field in self.PASSENGER_FIELDS):
+                raise ValueError
+            passenger['birth_date'] = datetime.datetime.fromisoformat(passenger['birth_date'])
+
+        passenger_number = len(passengers) or order.get('passenger_number')
+        if not legs or type(passenger_number) is not int or passenger_number < 1 \
+                or any(type(schedule_id) is not int for schedule_id in legs.values()):
+            raise ValueError
+
+        return {'passenger_number': passenger_number, 'legs': legs, 'passengers': passengers}
+
+    @validate_login
+    @idempotent
+    def post(self, request):
+        try:
+            orders = json.loads(request.body)['orders']
+            if type(orders) is not list or not 1 <= len(orders) <= BULK_BOOKING_MAX_ORDERS:
+                raise ValueError
+
+            orders = book_many(request.user, [self.parse_booking(order) for order in orders])
+
+            return JsonResponse({'message': 'success', 'order_ids': [order.id for order in orders]}, status=201)
+        except json.decoder.JSONDecodeError:
+            return JsonResponse({'message': 'no_body'}, status=400)
+        except KeyError:
+            return JsonResponse({'message': 'key_error'}, status=400)
+        except (TypeError, ValueError, AttributeError):
+            return JsonResponse({'message': 'invalid_input'}, status=400)
+        except ReservationError as error:
+            status = 401 if error.message == LEG_NO_SEAT_REMAIN else 400
+            return JsonResponse({'message': error.message, 'legs': error.legs}, status=status)
+
+class ScheduleCancelView(View):
+    @validate_login
+    def post(self, request, schedule_id):
+        try:
+            if not request.user.is_operator:
+                return JsonResponse({'message': 'permission_denied'}, status=403)
+
+            data      = json.loads(request.body) if request.body else {}
+            cancelled = cancel_schedule(schedule_id, close=bool(data.get('close')))
+
+            return JsonResponse({'message': 'success', 'cancelled_orders': cancelled}, status=201)
+        except json.decoder.JSONDecodeError:
+            return JsonResponse({'message': 'no_body'}, status=400)
+        except Schedule.DoesNotExist:
+            return JsonResponse({'message': 'invalid_id'}, status=400)
+
+class WaitlistView(View):
+    @validate_login
+    def post(self, request):
+        try:
+            data             = json.loads(request.body)
+            schedule_id      = data['schedule_id']
+            passenger_number = data['passenger_number']
+
+            if type(schedule_id) is not int or type(passenger_number) is not int or passenger_number < 1:
+                return JsonResponse({'message': 'invalid_input'}, status=400)
+
+            entry = join_waitlist(request.user, schedule_id, passenger_number)
+            if not entry:
+                return JsonResponse({'message': 'seat_available'}, status=400)
+
+            return JsonResponse({'message': 'success', 'waitlist_id': entry.id, 'position': waitlist_position(entry)}, status=201)
+        except json.decoder.JSONDecodeError:
+            return JsonResponse({'message': 'no_body'}, status=400)
+        except KeyError:
+            return JsonResponse({'message': 'key_error'}, status=400)
+        except Schedule.DoesNotExist:
+            return JsonResponse({'message': 'invalid_id'}, status=400)
+        except ExceedsCapacity:
+            return JsonResponse({'message': 'exceeds_capacity'}, status=400)
+        except IntegrityError:
+            return JsonResponse({'message': 'already_exists'}, status=400)
+
+    @validate_login
+    def delete(self, request, waitlist_id):
+        deleted, _ = WaitlistEntry.objects.filter(id=waitlist_id, user=request.user).delete()
+        if not deleted:
+            return JsonResponse({'message': 'invalid_id'}, status=400)
+
+        return JsonResponse({'message': 'success'}, status=201)
+
+class HoldView(View):
+    @validate_login
+    def post(self, request):
+        try:
+            data             = json.loads(request.body)
+            schedule_id      = data['schedule_id']
+            passenger_number = data['passenger_number']
 
-            for schedule_order in schedule_orders:
-                schedule = schedule_order.schedule
-                schedule.seat_remain += schedule_order.passenger_number
-                schedule.save()
-                schedule_order.delete()
+            if type(schedule_id) is not int or type(passenger_number) is not int or passenger_number < 1:
+                return JsonResponse({'message': 'invalid_input'}, status=400)
+
+            hold = place_hold(request.user, schedule_id, passenger_number)
+
+            return JsonResponse({'message': 'success', 'hold_id': hold.id, 'expires_at': hold.expires_at}, status=201)
+        except json.decoder.JSONDecodeError:
+            return JsonResponse({'message': 'no_body'}, status=400)
+        except KeyError:
+            return JsonResponse({'message': 'key_error'}, status=400)
+        except ReservationError as error:
+            status = 401 if error.message == LEG_NO_SEAT_REMAIN else 400
+            return JsonResponse({'message': error.message}, status=status)
 
-            order.delete()
+    @validate_login
+    def delete(self, request, hold_id):
+        try:
+            release_hold(request.user, hold_id)
 
             return JsonResponse({'message': 'success'}, status=201)
-        except Order.DoesNotExist:
+        except SeatHold.DoesNotExist:
             return JsonResponse({'message': 'invalid_id'}, status=400)
+
+class BookingTicketView(View):
+    @validate_login
+    def get(self, request, ticket_id):
+        ticket = booking_pipeline.ticket(ticket_id, request.user)
+        if not ticket:
+            return JsonResponse({'message': 'invalid_id'}, status=400)
+
+        return JsonResponse({'message': 'success', 'ticket': ticket.to_dict()}, status=200)
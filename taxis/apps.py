@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TaxisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'taxis'
+
+    def ready(self):
+        import taxis.signals
@@ -0,0 +1,108 @@
+import time
+import random
+import datetime
+import statistics
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db                   import connection
+from django.db.models            import Q
+
+from taxis.models                import Schedule, Course, Location, ScheduleSearchRow
+from taxis.search                import fare_calendar
+from taxis.seeding               import seed_timetable, purge_timetable
+
+class Command(BaseCommand):
+    help = 'Seed a synthetic timetable and report schedule search query plans and latencies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations', type=int, default=10)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--courses-per-route', type=int, default=4)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--compare', action='store_true', help='also measure with the search indexes dropped')
+        parser.add_argument('--allow-index-changes', action='store_true', help='let --compare alter indexes when DEBUG is off')
+        parser.add_argument('--keep', action='store_true', help='keep the seeded timetable')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['compare'] and not (settings.DEBUG or options['allow_index_changes']):
+            raise CommandError('--compare drops and re-creates indexes on {}; set DEBUG or pass --allow-index-changes'.format(
+                connection.settings_dict['NAME']))
+
+        generator = random.Random(options['seed'])
+        timetable = seed_timetable(
+                locations         = options['locations'],
+                days              = options['days'],
+                courses_per_route = options['courses_per_route'],
+                seed              = options['seed']
+                )
+        self.stdout.write('seeded {} schedules'.format(timetable['schedules']))
+
+        searches = []
+        for _ in range(options['queries']):
+            departure, arrival = generator.sample(timetable['locations'], 2)
+            searches.append((departure, arrival, generator.choice(timetable['dates']), generator.choice(timetable['seat_types'])))
+
+        try:
+            self.report('with indexes', searches, timetable)
+            if options['compare']:
+                indexed_models = [Location, ScheduleSearchRow]
+                with connection.schema_editor() as schema_editor:
+                    for model in indexed_models:
+                        for index in model._meta.indexes:
+                            schema_editor.remove_index(model, index)
+                try:
+                    self.report('without indexes', searches, timetable)
+                finally:
+                    with connection.schema_editor() as schema_editor:
+                        for model in indexed_models:
+                            for index in model._meta.indexes:
+                                schema_editor.add_index(model, index)
+        finally:
+            if not options['keep']:
+                purge_timetable()
+
+    def join_query(self, departure, arrival, date, seat_type, timetable):
+        courses = Course.objects.filter(Q(departure_location__name=departure) & Q(arrival_location__name=arrival))
+        return Schedule.objects.filter(
+                Q(date=date)
+                & Q(seat_type__name=seat_type)
+                & Q(course_id__in=courses)
+                & Q(seat_remain__gte=1)
+                & Q(price__lte=60000)
+                & Q(course__taxi_company__name__in=timetable['companies'])
+                & Q(course__departure_time__lte='1900-01-01 23:00')
+                ).select_related(
+                        'course__departure_location',
+                        'course__arrival_location',
+                        'course__taxi_company',
+                        'seat_type',
+                        'taxi_driver__taxi_company'
+                        ).order_by('-price')
+
+    def read_model_query(self, departure, arrival, date, seat_type, timetable):
+        return ScheduleSearchRow.objects.filter(
+                departure_location_name__iexact = departure,
+                arrival_location_name__iexact   = arrival,
+                date                            = date
+                )
+
+    def calendar_query(self, departure, arrival, date, seat_type, timetable):
+        return fare_calendar.query(departure, arrival, date, date + datetime.timedelta(days=6))
+
+    def report(self, label, searches, timetable):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+
+        for name, build in (('join', self.join_query), ('read model', self.read_model_query), ('fare calendar', self.calendar_query)):
+            self.stdout.write('{} plan:\n{}'.format(name, build(*searches[0], timetable).explain()))
+
+            latencies = []
+            for search in searches:
+                started = time.perf_counter()
+                list(build(*search, timetable))
+                latencies.append((time.perf_counter() - started) * 1000)
+
+            percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            self.stdout.write('{}: p50 {:.2f}ms  p95 {:.2f}ms  p99 {:.2f}ms  mean {:.2f}ms'.format(
+                name, percentiles[49], percentiles[94], percentiles[98], statistics.mean(latencies)))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from taxis.search_rows           import rebuild_search_rows
+from taxis.search                import search_index, search_cache
+
+class Command(BaseCommand):
+    help = 'Rebuild the schedule_search_rows read model from schedules'
+
+    def handle(self, *args, **options):
+        count = rebuild_search_rows()
+        search_index.clear()
+        search_cache.clear()
+        self.stdout.write(self.style.SUCCESS('rebuilt {} schedule search rows'.format(count)))
@@ -0,0 +1,90 @@
+# Generated by Django 3.2.3 on 2026-10-18 15:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Frozen copy of taxis.search_rows.SEARCH_ROW_COLUMNS as of this migration.
+SEARCH_ROW_COLUMNS = {
+    'schedule_id'              : 'id',
+    'date'                     : 'date',
+    'price'                    : 'price',
+    'seat_remain'              : 'seat_remain',
+    'course_id'                : 'course_id',
+    'departure_time'           : 'course__departure_time',
+    'arrival_time'             : 'course__arrival_time',
+    'taxi_code'                : 'course__taxi_code',
+    'departure_location_id'    : 'course__departure_location_id',
+    'departure_location_name'  : 'course__departure_location__name',
+    'departure_location_code'  : 'course__departure_location__location_code',
+    'arrival_location_id'      : 'course__arrival_location_id',
+    'arrival_location_name'    : 'course__arrival_location__name',
+    'arrival_location_code'    : 'course__arrival_location__location_code',
+    'taxi_company_name'        : 'course__taxi_company__name',
+    'taxi_company_url'         : 'course__taxi_company__logo_url',
+    'seat_type_id'             : 'seat_type_id',
+    'seat_type_name'           : 'seat_type__name',
+    'sale_rate'                : 'seat_type__sale_rate',
+    'taxi_driver_id'           : 'taxi_driver_id',
+    'taxi_driver_name'         : 'taxi_driver__name',
+    'taxi_driver_company_name' : 'taxi_driver__taxi_company__name',
+    'profile_url'              : 'taxi_driver__profile_url',
+    'introduction'             : 'taxi_driver__introduction',
+}
+
+
+def populate_search_rows(apps, schema_editor):
+    Schedule          = apps.get_model('taxis', 'Schedule')
+    ScheduleSearchRow = apps.get_model('taxis', 'ScheduleSearchRow')
+
+    columns = list(SEARCH_ROW_COLUMNS.keys())
+    rows    = [
+            ScheduleSearchRow(**dict(zip(columns, values)))
+            for values in Schedule.objects.values_list(*SEARCH_ROW_COLUMNS.values()) ]
+    ScheduleSearchRow.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxis', '0002_auto_20210526_0505'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleSearchRow',
+            fields=[
+                ('schedule', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_row', serialize=False, to='taxis.schedule')),
+                ('date', models.DateTimeField()),
+                ('price', models.DecimalField(decimal_places=3, max_digits=13)),
+                ('seat_remain', models.IntegerField()),
+                ('course_id', models.BigIntegerField()),
+                ('departure_time', models.DateTimeField()),
+                ('arrival_time', models.DateTimeField()),
+                ('taxi_code', models.CharField(max_length=45)),
+                ('departure_location_id', models.BigIntegerField()),
+                ('departure_location_name', models.CharField(max_length=45)),
+                ('departure_location_code', models.CharField(max_length=20)),
+                ('arrival_location_id', models.BigIntegerField()),
+                ('arrival_location_name', models.CharField(max_length=45)),
+                ('arrival_location_code', models.CharField(max_length=20)),
+                ('taxi_company_name', models.CharField(max_length=45)),
+                ('taxi_company_url', models.URLField(default='', max_length=2000)),
+                ('seat_type_id', models.BigIntegerField()),
+                ('seat_type_name', models.CharField(max_length=45)),
+                ('sale_rate', models.DecimalField(decimal_places=2, max_digits=3)),
+                ('taxi_driver_id', models.BigIntegerField()),
+                ('taxi_driver_name', models.CharField(max_length=45)),
+                ('taxi_driver_company_name', models.CharField(max_length=45)),
+                ('profile_url', models.URLField(default='', max_length=2000)),
+                ('introduction', models.CharField(max_length=2000)),
+            ],
+            options={
+                'db_table': 'schedule_search_rows',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='schedulesearchrow',
+            index=models.Index(fields=['departure_location_name', 'arrival_location_name', 'date'], name='search_rows_route_date_idx'),
+        ),
+        migrations.RunPython(populate_search_rows, migrations.RunPython.noop),
+    ]
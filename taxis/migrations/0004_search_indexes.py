@@ -0,0 +1,25 @@
+# Generated by Django 3.2.3 on 2026-10-18 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxis', '0003_schedule_search_rows'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['name'], name='locations_name_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='schedulesearchrow',
+            name='search_rows_route_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='schedulesearchrow',
+            index=models.Index(fields=['departure_location_name', 'arrival_location_name', 'date', 'seat_type_name', 'price', 'seat_remain'], name='search_rows_route_fare_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxis', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='closed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -18,6 +18,7 @@ class Schedule(models.Model):
     seat_remain        = models.IntegerField()
     taxi_driver        = models.ForeignKey("TaxiDriver", on_delete=models.CASCADE)
     date               = models.DateTimeField()
+    closed             = models.BooleanField(default=False)
 
     class Meta:
         db_table  = "schedules"
@@ -38,6 +39,9 @@ class Location(models.Model):
 
     class Meta:
         db_table = "locations"
+        indexes  = [
+            models.Index(fields=['name'], name='locations_name_idx'),
+        ]
 
 class TaxiCompany(models.Model):
     name               = models.CharField(max_length=45)
@@ -63,3 +67,38 @@ class DriverReview(models.Model):
 
     class Meta:
         db_table = "driver_reviews"
+
+class ScheduleSearchRow(models.Model):
+    schedule                 = models.OneToOneField("Schedule", on_delete=models.CASCADE, primary_key=True, related_name='search_row')
+    date                     = models.DateTimeField()
+    price                    = models.DecimalField(max_digits=13, decimal_places=3)
+    seat_remain              = models.IntegerField()
+    closed                   = models.BooleanField(default=False)
+    course_id                = models.BigIntegerField()
+    departure_time           = models.DateTimeField()
+    arrival_time             = models.DateTimeField()
+    taxi_code                = models.CharField(max_length=45)
+    departure_location_id    = models.BigIntegerField()
+    departure_location_name  = models.CharField(max_length=45)
+    departure_location_code  = models.CharField(max_length=20)
+    arrival_location_id      = models.BigIntegerField()
+    arrival_location_name    = models.CharField(max_length=45)
+    arrival_location_code    = models.CharField(max_length=20)
+    taxi_company_name        = models.CharField(max_length=45)
+    taxi_company_url         = models.URLField(max_length=2000, default='')
+    seat_type_id             = models.BigIntegerField()
+    seat_type_name           = models.CharField(max_length=45)
+    sale_rate                = models.DecimalField(max_digits=3, decimal_places=2)
+    taxi_driver_id           = models.BigIntegerField()
+    taxi_driver_name         = models.CharField(max_length=45)
+    taxi_driver_company_name = models.CharField(max_length=45)
+    profile_url              = models.URLField(max_length=2000, default='')
+    introduction             = models.CharField(max_length=2000)
+
+    class Meta:
+        db_table = "schedule_search_rows"
+        # The route and date prefix serves the search index; the trailing columns let the fare
+        # calendar group and aggregate straight from the index.
+        indexes  = [
+            models.Index(fields=['departure_location_name', 'arrival_location_name', 'date', 'seat_type_name', 'price', 'seat_remain'], name='search_rows_route_fare_idx'),
+        ]
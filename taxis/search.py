@@ -0,0 +1,450 @@
+import json
+import heapq
+import bisect
+import itertools
+import time
+import base64
+import datetime
+import threading
+from collections                import OrderedDict
+from decimal                    import Decimal
+from urllib.parse               import urlencode
+
+from django.db.models           import Q, Min, Sum
+from django.db.models.functions import TruncDate
+
+from taxis.models               import ScheduleSearchRow
+
+SEARCH_INDEX_MAX_ROUTES = 1024
+SEARCH_INDEX_TTL        = 60
+SEARCH_PAGE_MAX_LIMIT   = 100
+ROUND_TRIP_PAIR_LIMIT   = 10
+FACET_PRICE_CEILINGS    = (10000, 20000, 30000, 40000, 50000, 60000)
+SEARCH_CACHE_MAX_SIZE   = 2048
+SEARCH_CACHE_TTL        = 60
+CALENDAR_MAX_DAYS       = 62
+CALENDAR_CACHE_MAX_SIZE = 8192
+CALENDAR_CACHE_TTL      = 60
+
+class InvalidCursor(Exception):
+    pass
+
+class ScheduleRecord:
+    __slots__ = (
+            'id', 'price', 'seat_remain', 'date',
+            'course_id', 'seat_type_id', 'taxi_driver_id',
+            'departure_time', 'arrival_time', 'taxi_code',
+            'arrival_location_id', 'arrival_location_name', 'arrival_location_code',
+            'departure_location_id', 'departure_location_name', 'departure_location_code',
+            'taxi_company', 'taxi_company_url',
+            'seat_name', 'sale_rate',
+            'taxi_driver_name', 'taxi_driver_company', 'profile_url', 'introduction'
+            )
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+                id                      = row.schedule_id,
+                price                   = row.price,
+                seat_remain             = row.seat_remain,
+                date                    = row.date,
+                course_id               = row.course_id,
+                seat_type_id            = row.seat_type_id,
+                taxi_driver_id          = row.taxi_driver_id,
+                departure_time          = row.departure_time,
+                arrival_time            = row.arrival_time,
+                taxi_code               = row.taxi_code,
+                arrival_location_id     = row.arrival_location_id,
+                arrival_location_name   = row.arrival_location_name,
+                arrival_location_code   = row.arrival_location_code,
+                departure_location_id   = row.departure_location_id,
+                departure_location_name = row.departure_location_name,
+                departure_location_code = row.departure_location_code,
+                taxi_company            = row.taxi_company_name,
+                taxi_company_url        = row.taxi_company_url,
+                seat_name               = row.seat_type_name,
+                sale_rate               = row.sale_rate,
+                taxi_driver_name        = row.taxi_driver_name,
+                taxi_driver_company     = row.taxi_driver_company_name,
+                profile_url             = row.profile_url,
+                introduction            = row.introduction
+                )
+
+    def to_dict(self):
+        return {
+            'id'          : self.id,
+            'price'       : self.price,
+            'seat_remain' : self.seat_remain,
+            'date'        : self.date,
+            'courses' : {
+                'departure_time'          : self.departure_time,
+                'arrival_time'            : self.arrival_time,
+                'taxi_code'               : self.taxi_code,
+                'arrival_location_id'     : self.arrival_location_id,
+                'arrival_location_name'   : self.arrival_location_name,
+                'arrival_location_code'   : self.arrival_location_code,
+                'departure_location_id'   : self.departure_location_id,
+                'departure_location_name' : self.departure_location_name,
+                'departure_location_code' : self.departure_location_code,
+                'taxi_company'            : self.taxi_company,
+                'taxi_company_url'        : self.taxi_company_url
+            },
+            'seat_type' : {
+                'seat_name' : self.seat_name,
+                'sale_rate' : self.sale_rate
+                },
+            'taxi_driver' : {
+                'taxi_driver_name' : self.taxi_driver_name,
+                'taxi_company'     : self.taxi_driver_company,
+                'profile_url'      : self.profile_url,
+                'introduction'     : self.introduction
+                }
+        }
+
+def route_key(departure_location_name, arrival_location_name, date):
+    return (departure_location_name.casefold(), arrival_location_name.casefold(), date)
+
+def filter_schedules(records, seat_type, seat_remain, price, taxi_company, departure_time, sort):
+    taxi_company = set(taxi_company)
+
+    results = [
+            record for record in records
+            if record.seat_name == seat_type
+            and record.seat_remain >= seat_remain
+            and record.price <= price
+            and record.taxi_company in taxi_company
+            and record.departure_time <= departure_time ]
+
+    results.sort(key=lambda record: (getattr(record, sort), record.id), reverse=True)
+    return results
+
+def facet_counts(records, seat_type, seat_remain, price, taxi_company, departure_time, ceilings=FACET_PRICE_CEILINGS):
+    taxi_company  = set(taxi_company)
+    companies     = {}
+    seat_types    = {}
+    price_buckets = [0] * (len(ceilings) + 1)
+
+    for record in records:
+        companies.setdefault(record.taxi_company, 0)
+        seat_types.setdefault(record.seat_name, 0)
+
+        if record.seat_remain < seat_remain or record.departure_time > departure_time:
+            continue
+
+        # Each facet counts the schedules every other active filter lets through.
+        company_matches   = record.taxi_company in taxi_company
+        seat_type_matches = record.seat_name == seat_type
+        price_matches     = record.price <= price
+
+        if seat_type_matches and price_matches:
+            companies[record.taxi_company] += 1
+        if company_matches and price_matches:
+            seat_types[record.seat_name] += 1
+        if company_matches and seat_type_matches:
+            price_buckets[bisect.bisect_left(ceilings, record.price)] += 1
+
+    price_counts = list(itertools.accumulate(price_buckets))[:len(ceilings)]
+
+    return {
+        'taxi_company' : [{'name': name, 'count': count} for name, count in sorted(companies.items())],
+        'seat_type'    : [{'name': name, 'count': count} for name, count in sorted(seat_types.items())],
+        'price'        : [{'max_price': ceiling, 'count': count} for ceiling, count in zip(ceilings, price_counts)]
+    }
+
+def cheapest_pairs(going_schedules, coming_schedules, limit=ROUND_TRIP_PAIR_LIMIT):
+    def departs_after_arrival(going, coming):
+        going_arrival    = datetime.datetime.combine(going.date.date(), going.arrival_time.time())
+        coming_departure = datetime.datetime.combine(coming.date.date(), coming.departure_time.time())
+        return coming_departure > going_arrival
+
+    pairs = (
+            (going.price + coming.price, going.id, coming.id)
+            for going in going_schedules
+            for coming in coming_schedules
+            if departs_after_arrival(going, coming) )
+
+    return [
+            {
+                'going_schedule_id'  : going_id,
+                'coming_schedule_id' : coming_id,
+                'total_price'        : total_price
+            } for total_price, going_id, coming_id in heapq.nsmallest(limit, pairs) ]
+
+class ScheduleSearchIndex:
+    def __init__(self, max_routes=SEARCH_INDEX_MAX_ROUTES, ttl=SEARCH_INDEX_TTL):
+        self.max_routes = max_routes
+        self.ttl        = ttl
+        self.buckets    = OrderedDict()
+        self.schedules  = {}
+        self.generation = 0
+        self.lock       = threading.Lock()
+
+    def load(self, keys):
+        # Buckets are keyed case-insensitively, so the names must match the same way here.
+        query = Q()
+        for departure_location_name, arrival_location_name, date in keys:
+            query |= Q(
+                    departure_location_name__iexact = departure_location_name,
+                    arrival_location_name__iexact   = arrival_location_name,
+                    date                            = date
+                    )
+
+        records = {route_key(*key): [] for key in keys}
+        for row in ScheduleSearchRow.objects.filter(query, closed=False):
+            records[route_key(row.departure_location_name, row.arrival_location_name, row.date)].append(ScheduleRecord.from_row(row))
+        return [records[route_key(*key)] for key in keys]
+
+    def routes(self, keys):
+        now   = time.monotonic()
+        keys  = [route_key(*key) for key in keys]
+        found = {}
+
+        with self.lock:
+            for key in keys:
+                entry = self.buckets.get(key)
+                if entry and entry[0] > now:
+                    self.buckets.move_to_end(key)
+                    found[key] = entry[1]
+            generation = self.generation
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            loaded = self.load(missing)
+            with self.lock:
+                # A refresh or invalidation that landed during the load may not be reflected in it.
+                cache = generation == self.generation
+                for key, records in zip(missing, loaded):
+                    found[key] = records
+                    if not cache:
+                        continue
+                    self._discard(key)
+                    self.buckets[key] = (now + self.ttl, records)
+                    for record in records:
+                        self.schedules[record.id] = (key, record)
+
+                while len(self.buckets) > self.max_routes:
+                    self._discard(next(iter(self.buckets)))
+
+        return [found[key] for key in keys]
+
+    def route(self, departure_location_name, arrival_location_name, date):
+        return self.routes([(departure_location_name, arrival_location_name, date)])[0]
+
+    def invalidate(self, schedule_ids):
+        with self.lock:
+            self.generation += 1
+            for schedule_id in schedule_ids:
+                entry = self.schedules.get(schedule_id)
+                if entry:
+                    self._discard(entry[0])
+
+    def refresh(self, schedule):
+        with self.lock:
+            self.generation += 1
+            entry = self.schedules.get(schedule.id)
+            if not entry:
+                return
+            record = entry[1]
+            if not schedule.closed and (record.date, record.course_id, record.seat_type_id, record.taxi_driver_id) \
+                    == (schedule.date, schedule.course_id, schedule.seat_type_id, schedule.taxi_driver_id):
+                record.price       = schedule.price
+                record.seat_remain = schedule.seat_remain
+            else:
+                self._discard(entry[0])
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.buckets.clear()
+            self.schedules.clear()
+
+    def _discard(self, key):
+        entry = self.buckets.pop(key, None)
+        if not entry:
+            return
+        for record in entry[1]:
+            if self.schedules.get(record.id, (None,))[0] == key:
+                del self.schedules[record.id]
+
+def encode_cursor(sort, record):
+    value = getattr(record, sort)
+    value = value.isoformat() if sort == 'departure_time' else str(value)
+    return base64.urlsafe_b64encode(json.dumps([sort, value, record.id]).encode('utf-8')).decode('utf-8')
+
+def decode_cursor(sort, cursor):
+    try:
+        cursor_sort, value, schedule_id = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+        if cursor_sort != sort:
+            raise InvalidCursor
+        value = datetime.datetime.fromisoformat(value) if sort == 'departure_time' else Decimal(value)
+        if isinstance(value, Decimal) and not value.is_finite():
+            raise InvalidCursor
+        # Timetable times are naive, and comparing them with an aware value raises TypeError later.
+        if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+            raise InvalidCursor
+        return value, int(schedule_id)
+    except (ValueError, TypeError, ArithmeticError, UnicodeError):
+        raise InvalidCursor
+
+def paginate(records, sort, cursor=None, limit=None):
+    if cursor:
+        position = decode_cursor(sort, cursor)
+        records  = [record for record in records if (getattr(record, sort), record.id) < position]
+
+    if limit is None or len(records) <= limit:
+        return records, None
+
+    page = records[:limit]
+    return page, encode_cursor(sort, page[-1])
+
+class SearchResultCache:
+    def __init__(self, max_size=SEARCH_CACHE_MAX_SIZE, ttl=SEARCH_CACHE_TTL):
+        self.max_size   = max_size
+        self.ttl        = ttl
+        self.entries    = OrderedDict()
+        self.schedules  = {}
+        self.generation = 0
+        self.hits       = 0
+        self.misses     = 0
+        self.lock       = threading.Lock()
+
+    @staticmethod
+    def make_key(query):
+        return urlencode(sorted((key, value) for key in query for value in query.getlist(key)))
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, key, content, schedule_ids, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self._discard(key)
+            self.entries[key] = (time.monotonic() + self.ttl, content, schedule_ids)
+            for schedule_id in schedule_ids:
+                self.schedules.setdefault(schedule_id, set()).add(key)
+
+            while len(self.entries) > self.max_size:
+                self._discard(next(iter(self.entries)))
+
+    def invalidate(self, schedule_ids):
+        with self.lock:
+            self.generation += 1
+            for schedule_id in schedule_ids:
+                for key in list(self.schedules.get(schedule_id, ())):
+                    self._discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.schedules.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if not entry:
+            return
+        for schedule_id in entry[2]:
+            keys = self.schedules.get(schedule_id)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self.schedules[schedule_id]
+
+class FareCalendar:
+    def __init__(self, max_size=CALENDAR_CACHE_MAX_SIZE, ttl=CALENDAR_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl      = ttl
+        self.days       = OrderedDict()
+        self.lock       = threading.Lock()
+        self.generation = 0
+
+    def query(self, departure_location_name, arrival_location_name, start_date, end_date):
+        return ScheduleSearchRow.objects.filter(
+                departure_location_name = departure_location_name,
+                arrival_location_name   = arrival_location_name,
+                date__gte               = start_date,
+                date__lt                = end_date + datetime.timedelta(days=1),
+                seat_remain__gt         = 0,
+                closed                  = False
+                ).annotate(day=TruncDate('date'))\
+                .values('day', 'seat_type_name')\
+                .annotate(lowest_price=Min('price'), seat_remain=Sum('seat_remain'))\
+                .order_by('day', 'seat_type_name')
+
+    def load(self, departure_location_name, arrival_location_name, start_date, end_date):
+        days = {}
+        for group in self.query(departure_location_name, arrival_location_name, start_date, end_date):
+            days.setdefault(group['day'], []).append(
+                    {
+                        'seat_name'    : group['seat_type_name'],
+                        'lowest_price' : group['lowest_price'],
+                        'seat_remain'  : group['seat_remain']
+                    })
+        return days
+
+    def get(self, departure_location_name, arrival_location_name, start_date, end_date):
+        dates   = [start_date + datetime.timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        now     = time.monotonic()
+        found   = {}
+
+        with self.lock:
+            generation = self.generation
+            for date in dates:
+                entry = self.days.get((departure_location_name, arrival_location_name, date))
+                if entry and entry[0] > now:
+                    found[date] = entry[1]
+
+        missing = [date for date in dates if date not in found]
+        if missing:
+            loaded = self.load(departure_location_name, arrival_location_name, missing[0], missing[-1])
+            with self.lock:
+                # An invalidation that landed while we were loading may have made these days stale already.
+                cache = generation == self.generation
+                for date in missing:
+                    found[date] = loaded.get(date, [])
+                    if cache:
+                        key = (departure_location_name, arrival_location_name, date)
+                        self.days.pop(key, None)
+                        self.days[key] = (now + self.ttl, found[date])
+
+                while len(self.days) > self.max_size:
+                    self.days.popitem(last=False)
+
+        return [
+                {
+                    'date'         : date,
+                    'lowest_price' : min((seat_type['lowest_price'] for seat_type in found[date]), default=None),
+                    'seat_remain'  : sum(seat_type['seat_remain'] for seat_type in found[date]),
+                    'seat_types'   : found[date]
+                } for date in dates ]
+
+    def invalidate_date(self, date):
+        with self.lock:
+            for key in [key for key in self.days if key[2] == date]:
+                del self.days[key]
+            self.generation += 1
+
+    def clear(self):
+        with self.lock:
+            self.days.clear()
+            self.generation += 1
+
+search_index = ScheduleSearchIndex()
+search_cache = SearchResultCache()
+fare_calendar = FareCalendar()
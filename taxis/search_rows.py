@@ -0,0 +1,85 @@
+from django.db        import transaction
+from django.db.models import OuterRef, Subquery
+
+from taxis.models     import Schedule, ScheduleSearchRow
+
+SEARCH_ROW_BATCH_SIZE = 1000
+
+SEARCH_ROW_COLUMNS = {
+    'schedule_id'              : 'id',
+    'date'                     : 'date',
+    'price'                    : 'price',
+    'seat_remain'              : 'seat_remain',
+    'closed'                   : 'closed',
+    'course_id'                : 'course_id',
+    'departure_time'           : 'course__departure_time',
+    'arrival_time'             : 'course__arrival_time',
+    'taxi_code'                : 'course__taxi_code',
+    'departure_location_id'    : 'course__departure_location_id',
+    'departure_location_name'  : 'course__departure_location__name',
+    'departure_location_code'  : 'course__departure_location__location_code',
+    'arrival_location_id'      : 'course__arrival_location_id',
+    'arrival_location_name'    : 'course__arrival_location__name',
+    'arrival_location_code'    : 'course__arrival_location__location_code',
+    'taxi_company_name'        : 'course__taxi_company__name',
+    'taxi_company_url'         : 'course__taxi_company__logo_url',
+    'seat_type_id'             : 'seat_type_id',
+    'seat_type_name'           : 'seat_type__name',
+    'sale_rate'                : 'seat_type__sale_rate',
+    'taxi_driver_id'           : 'taxi_driver_id',
+    'taxi_driver_name'         : 'taxi_driver__name',
+    'taxi_driver_company_name' : 'taxi_driver__taxi_company__name',
+    'profile_url'              : 'taxi_driver__profile_url',
+    'introduction'             : 'taxi_driver__introduction',
+}
+
+def build_search_rows(schedules):
+    lookups = list(SEARCH_ROW_COLUMNS.values())
+    columns = list(SEARCH_ROW_COLUMNS.keys())
+    return [
+            ScheduleSearchRow(**dict(zip(columns, values)))
+            for values in schedules.values_list(*lookups).distinct() ]
+
+def refresh_search_rows(schedules):
+    with transaction.atomic():
+        rows = build_search_rows(schedules)
+        for start in range(0, len(rows), SEARCH_ROW_BATCH_SIZE):
+            batch = rows[start:start + SEARCH_ROW_BATCH_SIZE]
+            ScheduleSearchRow.objects.filter(schedule_id__in=[row.schedule_id for row in batch]).delete()
+        ScheduleSearchRow.objects.bulk_create(rows, batch_size=SEARCH_ROW_BATCH_SIZE)
+    return len(rows)
+
+def sync_schedule_row(schedule):
+    updated = ScheduleSearchRow.objects.filter(
+            schedule_id    = schedule.id,
+            date           = schedule.date,
+            course_id      = schedule.course_id,
+            seat_type_id   = schedule.seat_type_id,
+            taxi_driver_id = schedule.taxi_driver_id
+            ).update(
+                    price       = schedule.price,
+                    seat_remain = schedule.seat_remain,
+                    closed      = schedule.closed
+                    )
+
+    if not updated:
+        refresh_search_rows(Schedule.objects.filter(id=schedule.id))
+
+def sync_seat_remain(schedule_ids):
+    # Closing a schedule goes through seats_changed too, so the flag travels with the seat count.
+    schedules = Schedule.objects.filter(id=OuterRef('schedule_id'))
+    ScheduleSearchRow.objects.filter(schedule_id__in=schedule_ids).update(
+            seat_remain = Subquery(schedules.values('seat_remain')[:1]),
+            closed      = Subquery(schedules.values('closed')[:1])
+            )
+
+def rebuild_search_rows():
+    count = 0
+    with transaction.atomic():
+        ScheduleSearchRow.objects.all().delete()
+        schedule_ids = list(Schedule.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(schedule_ids), SEARCH_ROW_BATCH_SIZE):
+            batch  = schedule_ids[start:start + SEARCH_ROW_BATCH_SIZE]
+            rows   = build_search_rows(Schedule.objects.filter(id__in=batch))
+            count += len(ScheduleSearchRow.objects.bulk_create(rows))
+    return count
@@ -0,0 +1,82 @@
+import random
+import datetime
+
+from django.db         import transaction
+
+from taxis.models      import Location, TaxiCompany, TaxiDriver, SeatType, Course, Schedule, ScheduleSearchRow
+from taxis.search_rows import refresh_search_rows
+
+SEED_PREFIX     = 'BENCH'
+SEED_START_DATE = datetime.datetime(2030, 1, 1)
+
+def seed_timetable(locations=10, days=30, courses_per_route=4, seat_remain=40, seed=None):
+    generator = random.Random(seed)
+
+    with transaction.atomic():
+        companies  = [
+                TaxiCompany.objects.create(name='{} Taxi {}'.format(SEED_PREFIX, index))
+                for index in range(3) ]
+        drivers    = [
+                TaxiDriver.objects.create(name='{} Driver {}'.format(SEED_PREFIX, index), taxi_company=company, introduction='')
+                for index, company in enumerate(companies) ]
+        seat_types = [
+                SeatType.objects.create(name='{} {}'.format(SEED_PREFIX, name), sale_rate=sale_rate)
+                for name, sale_rate in (('일반석', 1.0), ('비즈니스석', 2.0)) ]
+        stations   = [
+                Location.objects.create(
+                    name          = '{} {}'.format(SEED_PREFIX, index),
+                    latitude      = 37.5 + generator.uniform(-0.05, 0.05),
+                    longitude     = 126.9 + generator.uniform(-0.15, 0.15),
+                    location_code = '{}{}'.format(SEED_PREFIX, index)
+                    ) for index in range(locations) ]
+
+        courses = []
+        for departure in stations:
+            for arrival in stations:
+                if departure == arrival:
+                    continue
+                for index in range(courses_per_route):
+                    departure_time = datetime.datetime(1900, 1, 1, 8 + index * 12 // courses_per_route, generator.choice((0, 30)))
+                    courses.append(Course(
+                        departure_location = departure,
+                        arrival_location   = arrival,
+                        departure_time     = departure_time,
+                        arrival_time       = departure_time + datetime.timedelta(minutes=40),
+                        taxi_code          = '{}-{}-{}-{}'.format(SEED_PREFIX, departure.id, arrival.id, index),
+                        taxi_company       = generator.choice(companies)
+                        ))
+        Course.objects.bulk_create(courses, batch_size=1000)
+        course_ids = list(Course.objects.filter(taxi_code__startswith=SEED_PREFIX + '-').values_list('id', flat=True))
+
+        schedules = [
+                Schedule(
+                    course_id   = course_id,
+                    date        = SEED_START_DATE + datetime.timedelta(days=day),
+                    seat_type   = seat_type,
+                    price       = generator.randrange(10000, 60000, 1000),
+                    seat_remain = seat_remain,
+                    taxi_driver = generator.choice(drivers)
+                    )
+                for course_id in course_ids
+                for day in range(days)
+                for seat_type in seat_types ]
+        Schedule.objects.bulk_create(schedules, batch_size=1000)
+
+        seeded = Schedule.objects.filter(course__taxi_code__startswith=SEED_PREFIX + '-')
+        refresh_search_rows(seeded)
+
+    return {
+        'locations' : [station.name for station in stations],
+        'seat_types': [seat_type.name for seat_type in seat_types],
+        'companies' : [company.name for company in companies],
+        'schedules' : len(schedules),
+        'dates'     : [SEED_START_DATE + datetime.timedelta(days=day) for day in range(days)]
+    }
+
+def purge_timetable():
+    with transaction.atomic():
+        schedules = Schedule.objects.filter(course__taxi_code__startswith=SEED_PREFIX + '-')
+        ScheduleSearchRow.objects.filter(schedule__in=schedules).delete()
+        Location.objects.filter(location_code__startswith=SEED_PREFIX).delete()
+        TaxiCompany.objects.filter(name__startswith=SEED_PREFIX + ' ').delete()
+        SeatType.objects.filter(name__startswith=SEED_PREFIX + ' ').delete()
@@ -0,0 +1,87 @@
+import datetime
+
+from django.db                import transaction
+from django.db.models.signals import post_save, post_delete
+from django.db.models         import Q
+from django.dispatch          import receiver, Signal
+
+from taxis.models             import Schedule, Course, Location, TaxiCompany, TaxiDriver, SeatType
+from taxis.search             import search_index, search_cache, fare_calendar
+from taxis.search_rows        import refresh_search_rows, sync_schedule_row, sync_seat_remain
+from taxis.stations           import station_directory
+
+# Sent by bulk seat updates that bypass Schedule.save(), with schedule_ids.
+seats_changed = Signal()
+
+def invalidate_fare_calendar(schedule):
+    if isinstance(schedule.date, datetime.datetime):
+        fare_calendar.invalidate_date(schedule.date.date())
+    else:
+        fare_calendar.clear()
+
+@receiver(post_save, sender=Schedule)
+def schedule_saved(sender, instance, created, **kwargs):
+    if created:
+        refresh_search_rows(Schedule.objects.filter(id=instance.id))
+        search_index.clear()
+        search_cache.clear()
+        fare_calendar.clear()
+    else:
+        sync_schedule_row(instance)
+        search_index.refresh(instance)
+        search_cache.invalidate([instance.id])
+        invalidate_fare_calendar(instance)
+
+@receiver(post_delete, sender=Schedule)
+def schedule_deleted(sender, instance, **kwargs):
+    search_index.invalidate([instance.id])
+    search_cache.invalidate([instance.id])
+    invalidate_fare_calendar(instance)
+
+@receiver(seats_changed)
+def schedule_seats_changed(sender, schedule_ids, **kwargs):
+    schedule_ids = list(schedule_ids)
+    sync_seat_remain(schedule_ids)
+
+    def refresh_memory():
+        for schedule in Schedule.objects.filter(id__in=schedule_ids):
+            search_index.refresh(schedule)
+            invalidate_fare_calendar(schedule)
+        search_cache.invalidate(schedule_ids)
+
+    transaction.on_commit(refresh_memory)
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, **kwargs):
+    refresh_search_rows(Schedule.objects.filter(course=instance))
+
+@receiver(post_save, sender=Location)
+def location_saved(sender, instance, **kwargs):
+    refresh_search_rows(Schedule.objects.filter(Q(course__departure_location=instance) | Q(course__arrival_location=instance)))
+
+@receiver(post_save, sender=TaxiCompany)
+def taxi_company_saved(sender, instance, **kwargs):
+    refresh_search_rows(Schedule.objects.filter(Q(course__taxi_company=instance) | Q(taxi_driver__taxi_company=instance)))
+
+@receiver(post_save, sender=TaxiDriver)
+def taxi_driver_saved(sender, instance, **kwargs):
+    refresh_search_rows(Schedule.objects.filter(taxi_driver=instance))
+
+@receiver(post_save, sender=SeatType)
+def seat_type_saved(sender, instance, **kwargs):
+    refresh_search_rows(Schedule.objects.filter(seat_type=instance))
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Location)
+@receiver([post_save, post_delete], sender=TaxiCompany)
+@receiver([post_save, post_delete], sender=TaxiDriver)
+@receiver([post_save, post_delete], sender=SeatType)
+def timetable_changed(sender, **kwargs):
+    search_index.clear()
+    search_cache.clear()
+    fare_calendar.clear()
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Location)
+def stations_changed(sender, **kwargs):
+    station_directory.clear()
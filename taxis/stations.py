@@ -0,0 +1,183 @@
+import math
+import time
+import bisect
+import threading
+import unicodedata
+
+from django.db.models import Count
+
+from taxis.models     import Location
+
+STATION_DIRECTORY_TTL = 300
+STATION_GRID_CELL     = 0.05
+EARTH_RADIUS_KM       = 6371.0088
+KM_PER_DEGREE         = math.pi * EARTH_RADIUS_KM / 180
+AUTOCOMPLETE_LIMIT    = 10
+
+# Compatibility jamo typed on their own (ㅁ) mapped to the leading jamo NFD produces (ᄆ).
+CHOSEONG_TABLE = str.maketrans({jamo: chr(0x1100 + index) for index, jamo in enumerate('ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ')})
+
+def normalize_term(term):
+    return unicodedata.normalize('NFD', term.strip().translate(CHOSEONG_TABLE)).casefold()
+
+def haversine(latitude_1, longitude_1, latitude_2, longitude_2):
+    latitude_1, longitude_1, latitude_2, longitude_2 = map(math.radians, (latitude_1, longitude_1, latitude_2, longitude_2))
+    a = math.sin((latitude_2 - latitude_1) / 2) ** 2 \
+        + math.cos(latitude_1) * math.cos(latitude_2) * math.sin((longitude_2 - longitude_1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+class Station:
+    __slots__ = ('id', 'name', 'location_code', 'latitude', 'longitude', 'image_url', 'course_count')
+
+    def __init__(self, location):
+        self.id            = location.id
+        self.name          = location.name
+        self.location_code = location.location_code
+        self.latitude      = location.latitude
+        self.longitude     = location.longitude
+        self.image_url     = location.image_url
+        self.course_count  = location.course_count
+
+    def to_dict(self):
+        return {
+            "id"          : self.id,
+            "stationCode" : self.location_code,
+            "stationName" : self.name,
+            "longitude"   : self.longitude,
+            "latitude"    : self.latitude,
+            "imageUrl"    : self.image_url,
+            "courseCount" : self.course_count,
+            "description" : str(self.course_count)+'여 개의 한강 코스'
+        }
+
+class StationGrid:
+    def __init__(self, stations, cell=STATION_GRID_CELL):
+        self.cell  = cell
+        self.cells = {}
+        for station in stations:
+            self.cells.setdefault(self.cell_of(station.latitude, station.longitude), []).append(station)
+
+        rows         = [row for row, column in self.cells] or [0]
+        columns      = [column for row, column in self.cells] or [0]
+        self.bounds  = (min(rows), max(rows), min(columns), max(columns))
+
+    def cell_of(self, latitude, longitude):
+        return (math.floor(float(latitude) / self.cell), math.floor(float(longitude) / self.cell))
+
+    def ring(self, center, radius):
+        row, column = center
+        if radius == 0:
+            yield center
+            return
+        for offset in range(-radius, radius + 1):
+            yield (row - radius, column + offset)
+            yield (row + radius, column + offset)
+        for offset in range(-radius + 1, radius):
+            yield (row + offset, column - radius)
+            yield (row + offset, column + radius)
+
+    def nearest(self, latitude, longitude, k):
+        if not self.cells:
+            return []
+
+        center     = self.cell_of(latitude, longitude)
+        min_row, max_row, min_column, max_column = self.bounds
+        max_radius = max(
+                abs(center[0] - min_row), abs(center[0] - max_row),
+                abs(center[1] - min_column), abs(center[1] - max_column)
+                )
+        # Longitude degrees shrink towards the poles, so bound ring distance by the narrower axis.
+        cell_km    = self.cell * KM_PER_DEGREE * max(math.cos(math.radians(min(abs(latitude) + self.cell, 90))), 0.01)
+
+        found = []
+        for radius in range(max_radius + 1):
+            # Past this point the rings cover more cells than are occupied, so a plain scan is cheaper.
+            if (2 * radius + 1) ** 2 > len(self.cells):
+                found = [
+                        (haversine(latitude, longitude, float(station.latitude), float(station.longitude)), station.id, station)
+                        for stations in self.cells.values() for station in stations ]
+                break
+
+            for cell in self.ring(center, radius):
+                for station in self.cells.get(cell, ()):
+                    found.append((haversine(latitude, longitude, float(station.latitude), float(station.longitude)), station.id, station))
+
+            if len(found) >= k:
+                found.sort(key=lambda candidate: candidate[:2])
+                if found[k - 1][0] <= radius * cell_km:
+                    break
+
+        found.sort(key=lambda candidate: candidate[:2])
+        return [(distance, station) for distance, station_id, station in found[:k]]
+
+class StationPrefixIndex:
+    def __init__(self, stations):
+        entries = set()
+        for station in stations:
+            words = station.name.split()
+            terms = [station.location_code] + [' '.join(words[index:]) for index in range(len(words))]
+            for term in terms:
+                entries.add((normalize_term(term), station.id))
+
+        self.stations = {station.id: station for station in stations}
+        self.entries  = sorted(entries)
+        self.terms    = [term for term, station_id in self.entries]
+
+    def search(self, query, limit):
+        prefix = normalize_term(query)
+        if not prefix:
+            return []
+
+        start   = bisect.bisect_left(self.terms, prefix)
+        matches = {}
+        for term, station_id in self.entries[start:]:
+            if not term.startswith(prefix):
+                break
+            matches[station_id] = self.stations[station_id]
+
+        ranked = sorted(matches.values(), key=lambda station: (-station.course_count, station.name, station.id))
+        return ranked[:limit]
+
+class StationDirectory:
+    def __init__(self, ttl=STATION_DIRECTORY_TTL):
+        self.ttl        = ttl
+        self.expires_at = 0
+        self.stations   = []
+        self.grid       = None
+        self.prefixes   = None
+        self.lock       = threading.Lock()
+
+    def load(self):
+        locations = Location.objects.annotate(course_count=Count('arrival'))
+        return [Station(location) for location in locations]
+
+    def snapshot(self):
+        with self.lock:
+            if self.grid is not None and self.expires_at > time.monotonic():
+                return self.stations, self.grid, self.prefixes
+
+        stations = self.load()
+        grid     = StationGrid(stations)
+        prefixes = StationPrefixIndex(stations)
+
+        with self.lock:
+            self.stations   = stations
+            self.grid       = grid
+            self.prefixes   = prefixes
+            self.expires_at = time.monotonic() + self.ttl
+        return stations, grid, prefixes
+
+    def nearest(self, latitude, longitude, k):
+        stations, grid, prefixes = self.snapshot()
+        return grid.nearest(latitude, longitude, k)
+
+    def autocomplete(self, query, limit=AUTOCOMPLETE_LIMIT):
+        stations, grid, prefixes = self.snapshot()
+        return prefixes.search(query, limit)
+
+    def clear(self):
+        with self.lock:
+            self.grid       = None
+            self.expires_at = 0
+
+station_directory = StationDirectory()
@@ -1,10 +1,18 @@
 import json
+import base64
 import bcrypt
+import datetime
+from unittest               import mock
+from decimal                import Decimal
+from io                     import StringIO
 
-from django.test  import TestCase, Client
+from django.test            import TestCase, Client
+from django.core.management import call_command, CommandError
 
-from taxis.models import Location, TaxiDriver, TaxiCompany, DriverReview, Course, SeatType, Schedule
-from users.models import User
+from taxis.models           import Location, TaxiDriver, TaxiCompany, DriverReview, Course, SeatType, Schedule, ScheduleSearchRow
+from taxis.search           import search_index, search_cache, fare_calendar
+from taxis.stations         import station_directory, haversine
+from users.models           import User
 
 class LocationListTest(TestCase):
     @classmethod
@@ -39,6 +47,63 @@ class LocationListTest(TestCase):
                 }
         )
 
+class NearbyStationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Location.objects.create(id=1, name='망원', latitude=37.55561, longitude=126.89548, location_code='MWN', image_url='test')
+        Location.objects.create(id=2, name='여의도', latitude=37.52806, longitude=126.93247, location_code='YID', image_url='test')
+        Location.objects.create(id=3, name='잠실', latitude=37.51780, longitude=127.08628, location_code='JSL', image_url='test')
+
+    def setUp(self):
+        station_directory.clear()
+
+    def test_nearby_station_get_success(self):
+        client = Client()
+        client.get('/taxis/locations/nearby', {'latitude': 37.5, 'longitude': 127.0})
+
+        with self.assertNumQueries(0):
+            response = client.get('/taxis/locations/nearby', {'latitude': 37.556, 'longitude': 126.9, 'k': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([station['stationCode'] for station in response.json()['station']], ['MWN', 'YID'])
+        self.assertEqual(response.json()['station'][0]['courseCount'], 0)
+        self.assertLess(response.json()['station'][0]['distance'], 1)
+
+    def test_nearby_station_matches_full_scan(self):
+        stations, grid, prefixes = station_directory.snapshot()
+
+        for latitude, longitude in [(37.4, 126.7), (37.53, 127.0), (38.2, 128.0), (-33.9, 151.2)]:
+            expected = sorted(stations, key=lambda station: haversine(latitude, longitude, float(station.latitude), float(station.longitude)))
+            self.assertEqual([station.id for distance, station in grid.nearest(latitude, longitude, 2)], [station.id for station in expected[:2]])
+
+    def test_station_autocomplete(self):
+        TaxiCompany.objects.create(id=1, name='test', logo_url='test')
+        Course.objects.create(
+            departure_location_id = 1,
+            arrival_location_id   = 3,
+            departure_time        = '1900-01-01 10:00',
+            arrival_time          = '1900-01-01 11:00',
+            taxi_code             = 'test',
+            taxi_company_id       = 1
+        )
+        Location.objects.create(id=4, name='잠원', latitude=37.52, longitude=127.01, location_code='JWN', image_url='test')
+        client = Client()
+        client.get('/taxis/locations/autocomplete', {'q': '망'})
+
+        with self.assertNumQueries(0):
+            responses = [client.get('/taxis/locations/autocomplete', {'q': query}) for query in ('ㅈ', '자', '잠', 'jw', 'MW', '한강')]
+
+        self.assertEqual(
+                [[station['stationCode'] for station in response.json()['station']] for response in responses],
+                [['JSL', 'JWN'], ['JSL', 'JWN'], ['JSL', 'JWN'], ['JWN'], ['MWN'], []]
+        )
+
+    def test_nearby_station_invalid_input(self):
+        response = Client().get('/taxis/locations/nearby', {'latitude': 'a', 'longitude': 127.0})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'invalid_input'})
+
 class LocationDetailTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -507,4 +572,278 @@ class TaxilistTest(TestCase):
                     }
         }]
     })
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+
+class TaxiSearchIndexTest(TestCase):
+    def setUp(self):
+        search_index.clear()
+        search_cache.clear()
+        fare_calendar.clear()
+
+        Location.objects.create(id=1, name='망원', longitude=0, latitude=0, location_code='MWN', image_url='test')
+        Location.objects.create(id=2, name='선유도', longitude=0, latitude=0, location_code='SUD', image_url='test')
+        TaxiCompany.objects.create(id=1, name='Dasul Taxi', logo_url='test')
+        SeatType.objects.create(id=1, name='비즈니스석', sale_rate=2.0)
+        TaxiDriver.objects.create(id=1, name='이다슬', profile_url='test', introduction='test', taxi_company_id=1)
+        Course.objects.create(
+            id                    = 1,
+            departure_time        = '1900-01-01 10:00',
+            arrival_time          = '1900-01-01 11:00',
+            taxi_code             = 'DT001',
+            departure_location_id = 1,
+            arrival_location_id   = 2,
+            taxi_company_id       = 1
+        )
+        Course.objects.create(
+            id                    = 2,
+            departure_time        = '1900-01-01 12:00',
+            arrival_time          = '1900-01-01 13:00',
+            taxi_code             = 'DT002',
+            departure_location_id = 1,
+            arrival_location_id   = 2,
+            taxi_company_id       = 1
+        )
+        Schedule.objects.create(id=1, price=30000, seat_remain=9, date='2021-08-27', course_id=1, seat_type_id=1, taxi_driver_id=1)
+        Schedule.objects.create(id=2, price=20000, seat_remain=9, date='2021-08-27', course_id=2, seat_type_id=1, taxi_driver_id=1)
+
+    def tearDown(self):
+        search_index.clear()
+        search_cache.clear()
+
+    def search(self, **params):
+        query = {
+            'departure_location_name' : '망원',
+            'arrival_location_name'   : '선유도',
+            'seat_type'               : '비즈니스석',
+            'seat_remain'             : 1,
+            'departure_date'          : '2021-08-27',
+            'taxi_company'            : 'Dasul Taxi'
+        }
+        query.update(params)
+        return Client().get('/taxis', query)
+
+    def test_search_served_from_index(self):
+        with self.assertNumQueries(1):
+            response = self.search()
+        with self.assertNumQueries(0):
+            self.search(sort='dep_time')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([schedule['id'] for schedule in response.json()['Message']], [1, 2])
+        self.assertEqual(response.json()['Message'][0]['courses']['departure_location_code'], 'MWN')
+        self.assertEqual([schedule['id'] for schedule in self.search(sort='dep_time').json()['Message']], [2, 1])
+        self.assertEqual([schedule['id'] for schedule in self.search(price=25000).json()['Message']], [2])
+
+    def test_search_result_cache(self):
+        first = self.search()
+        hits  = search_cache.hits
+
+        with self.assertNumQueries(0):
+            second = self.search()
+
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(search_cache.hits, hits + 1)
+
+        schedule = Schedule.objects.get(id=1)
+        schedule.seat_remain = 0
+        schedule.save()
+
+        self.assertEqual([schedule['id'] for schedule in self.search().json()['Message']], [2])
+
+    def test_search_index_follows_seat_remain(self):
+        self.search()
+
+        schedule = Schedule.objects.get(id=1)
+        schedule.seat_remain = 3
+        schedule.save()
+
+        with self.assertNumQueries(0):
+            response = self.search(seat_remain=4)
+        self.assertEqual([schedule['id'] for schedule in response.json()['Message']], [2])
+
+    def test_search_index_skips_load_raced_by_refresh(self):
+        load = search_index.load
+        date = datetime.datetime(2021, 8, 27)
+
+        def racing_load(keys):
+            records = load(keys)
+            search_index.refresh(Schedule.objects.get(id=1))
+            return records
+
+        with mock.patch.object(search_index, 'load', racing_load):
+            self.assertEqual(len(search_index.route('망원', '선유도', date)), 2)
+        self.assertFalse(search_index.buckets)
+
+        search_index.route('망원', '선유도', date)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(search_index.route('망원', '선유도', date)), 2)
+
+    def test_search_keyset_pagination(self):
+        first  = self.search(limit=1).json()
+        second = self.search(limit=1, cursor=first['next_cursor']).json()
+
+        self.assertEqual([schedule['id'] for schedule in first['Message']], [1])
+        self.assertEqual([schedule['id'] for schedule in second['Message']], [2])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_search_invalid_cursor(self):
+        response = self.search(limit=1, cursor='invalid')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'invalid_cursor'})
+
+    def test_search_non_finite_price(self):
+        for price in ('NaN', 'sNaN', 'Infinity'):
+            response = self.search(price=price)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message': 'invalid_input'})
+
+    def test_search_aware_times(self):
+        for params in ({'departure_time': '1900-01-01T23:00+09:00'}, {'return_departure_time': '1900-01-01T23:00+09:00'}):
+            response = self.search(**params)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message': 'invalid_input'})
+
+        cursor   = base64.urlsafe_b64encode(json.dumps(['departure_time', '1900-01-01T22:00+09:00', 1]).encode('utf-8')).decode('utf-8')
+        response = self.search(sort='dep_time', limit=1, cursor=cursor)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'invalid_cursor'})
+
+    def test_search_streaming(self):
+        response = self.search(stream='true')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), self.search().json())
+
+    def test_search_rows_follow_timetable(self):
+        Location.objects.filter(id=2).update(name='여의도')
+        Location.objects.get(id=2).save()
+
+        self.assertEqual(ScheduleSearchRow.objects.filter(arrival_location_name='여의도').count(), 2)
+        self.assertEqual([schedule['id'] for schedule in self.search(arrival_location_name='여의도').json()['Message']], [1, 2])
+
+        ScheduleSearchRow.objects.all().delete()
+        call_command('rebuild_search_rows', stdout=StringIO())
+
+        self.assertEqual(ScheduleSearchRow.objects.count(), 2)
+
+    def test_fare_calendar(self):
+        SeatType.objects.create(id=2, name='일반석', sale_rate=1.0)
+        Schedule.objects.create(id=3, price=10000, seat_remain=4, date='2021-08-28', course_id=1, seat_type_id=2, taxi_driver_id=1)
+        query = {
+            'departure_location_name' : '망원',
+            'arrival_location_name'   : '선유도',
+            'start_date'              : '2021-08-26',
+            'end_date'                : '2021-08-28'
+        }
+
+        with self.assertNumQueries(1):
+            response = Client().get('/taxis/calendar', query)
+        with self.assertNumQueries(0):
+            Client().get('/taxis/calendar', query)
+
+        calendar = response.json()['calendar']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([day['date'] for day in calendar], ['2021-08-26', '2021-08-27', '2021-08-28'])
+        self.assertEqual([day['seat_remain'] for day in calendar], [0, 18, 4])
+        self.assertIsNone(calendar[0]['lowest_price'])
+        self.assertEqual(Decimal(calendar[1]['lowest_price']), 20000)
+        self.assertEqual(Decimal(calendar[2]['lowest_price']), 10000)
+        self.assertEqual([seat_type['seat_name'] for seat_type in calendar[2]['seat_types']], ['일반석'])
+
+        schedule = Schedule.objects.get(id=3)
+        schedule.seat_remain = 1
+        schedule.save()
+
+        self.assertEqual(Client().get('/taxis/calendar', query).json()['calendar'][2]['seat_remain'], 1)
+
+    def test_fare_calendar_skips_load_raced_by_invalidation(self):
+        load = fare_calendar.load
+        date = datetime.date(2021, 8, 27)
+
+        def racing_load(*args):
+            days = load(*args)
+            fare_calendar.invalidate_date(date)
+            return days
+
+        with mock.patch.object(fare_calendar, 'load', racing_load):
+            self.assertEqual(fare_calendar.get('망원', '선유도', date, date)[0]['seat_remain'], 18)
+        self.assertFalse(fare_calendar.days)
+
+        fare_calendar.get('망원', '선유도', date, date)
+        with self.assertNumQueries(0):
+            self.assertEqual(fare_calendar.get('망원', '선유도', date, date)[0]['seat_remain'], 18)
+
+    def test_round_trip_search(self):
+        Course.objects.create(
+            id                    = 3,
+            departure_time        = '1900-01-01 11:30',
+            arrival_time          = '1900-01-01 12:30',
+            taxi_code             = 'DT003',
+            departure_location_id = 2,
+            arrival_location_id   = 1,
+            taxi_company_id       = 1
+        )
+        Schedule.objects.create(id=3, price=5000, seat_remain=9, date='2021-08-27', course_id=3, seat_type_id=1, taxi_driver_id=1)
+
+        with self.assertNumQueries(1):
+            response = self.search(return_date='2021-08-27', pairs='true')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([schedule['id'] for schedule in response.json()['Message']], [1, 2])
+        self.assertEqual([schedule['id'] for schedule in response.json()['return']], [3])
+        self.assertEqual(
+                [(pair['going_schedule_id'], pair['coming_schedule_id']) for pair in response.json()['pairs']],
+                [(1, 3)]
+        )
+
+    def test_search_round_trip_rejects_paging(self):
+        for params in ({'limit': 1}, {'cursor': 'invalid'}, {'stream': 'true'}):
+            response = self.search(return_date='2021-08-27', **params)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message': 'invalid_input'})
+
+    def test_benchmark_search_command(self):
+        output = StringIO()
+        call_command('benchmark_search', locations=3, days=1, queries=3, stdout=output)
+
+        self.assertIn('read model: p50', output.getvalue())
+        self.assertEqual(Schedule.objects.count(), 2)
+
+    def test_benchmark_search_compare_requires_opt_in(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_search', locations=3, days=1, queries=3, compare=True, stdout=StringIO())
+
+        self.assertEqual(Schedule.objects.count(), 2)
+
+    def test_search_facets(self):
+        TaxiCompany.objects.create(id=2, name='DaMo taxi', logo_url='test')
+        Course.objects.filter(id=2).update(taxi_company_id=2)
+        Course.objects.get(id=2).save()
+
+        response = self.search(facets='true', price=25000)
+
+        self.assertEqual([schedule['id'] for schedule in response.json()['Message']], [])
+        self.assertEqual(response.json()['facets'], {
+            'taxi_company' : [{'name': 'DaMo taxi', 'count': 1}, {'name': 'Dasul Taxi', 'count': 0}],
+            'seat_type'    : [{'name': '비즈니스석', 'count': 0}],
+            'price'        : [
+                {'max_price': 10000, 'count': 0},
+                {'max_price': 20000, 'count': 0},
+                {'max_price': 30000, 'count': 1},
+                {'max_price': 40000, 'count': 1},
+                {'max_price': 50000, 'count': 1},
+                {'max_price': 60000, 'count': 1}
+            ]
+        })
+
+    def test_search_invalid_input(self):
+        response = self.search(seat_remain='a')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'invalid_input'})
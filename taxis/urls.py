@@ -1,14 +1,17 @@
 from django.urls import path
 
-from taxis.views import LocationListView, TaxiDriverListView, LocationDetailView, TaxiDriverDetailView, CouponListView, ReviewView, TaxiListView
+from taxis.views import LocationListView, NearbyStationView, StationAutocompleteView, TaxiDriverListView, LocationDetailView, TaxiDriverDetailView, CouponListView, ReviewView, TaxiListView, FareCalendarView
 
 urlpatterns = [
     path('/locations', LocationListView.as_view()),
+    path('/locations/nearby', NearbyStationView.as_view()),
+    path('/locations/autocomplete', StationAutocompleteView.as_view()),
     path('/taxidrivers', TaxiDriverListView.as_view()),
     path('/locations/<int:location_id>', LocationDetailView.as_view()),
     path('/taxidrivers/<int:driver_id>', TaxiDriverDetailView.as_view()),
     path('/coupons', CouponListView.as_view()),
     path('/reviews', ReviewView.as_view()),
     path('/reviews/<int:review_id>', ReviewView.as_view()),
+    path('/calendar', FareCalendarView.as_view()),
     path("", TaxiListView.as_view()),
 ]
\ No newline at end of file
@@ -1,16 +1,27 @@
 import random
 import json
 import datetime
-from json                       import JSONDecodeError
-
-from django.http                import JsonResponse
-from django.views               import View
-from django.db.models           import Count, Avg, Q
-from django.db.models.functions import Coalesce
-
-from taxis.models               import Location, TaxiDriver, DriverReview, Schedule, Course
-from users.models               import Coupon
-from decorators                 import validate_login
+from json                         import JSONDecodeError
+from decimal                      import Decimal, InvalidOperation
+
+from django.http                  import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.views                 import View
+from django.db.models             import Count, Avg
+from django.db.models.functions   import Coalesce
+
+from taxis.models                 import Location, TaxiDriver, DriverReview
+from taxis.search                 import (
+        search_index, search_cache, fare_calendar, filter_schedules, facet_counts, cheapest_pairs, paginate,
+        InvalidCursor, SEARCH_PAGE_MAX_LIMIT, CALENDAR_MAX_DAYS
+        )
+from taxis.stations               import station_directory
+from users.models                 import Coupon
+from decorators                   import validate_login
+
+NEARBY_STATION_DEFAULT        = 5
+NEARBY_STATION_MAX            = 50
+AUTOCOMPLETE_MAX_QUERY_LENGTH = 45
 
 class LocationListView(View):
     def get(self, request):
@@ -29,6 +40,36 @@ class LocationListView(View):
 
         return JsonResponse({'station': stations}, status=200)
 
+class NearbyStationView(View):
+    def get(self, request):
+        try:
+            latitude  = float(request.GET['latitude'])
+            longitude = float(request.GET['longitude'])
+            k         = int(request.GET.get('k', NEARBY_STATION_DEFAULT))
+        except KeyError:
+            return JsonResponse({'message': 'key_error'}, status=400)
+        except ValueError:
+            return JsonResponse({'message': 'invalid_input'}, status=400)
+
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < k <= NEARBY_STATION_MAX):
+            return JsonResponse({'message': 'invalid_input'}, status=400)
+
+        stations = [
+                dict(station.to_dict(), distance=round(distance, 3))
+                for distance, station in station_directory.nearest(latitude, longitude, k) ]
+
+        return JsonResponse({'station': stations}, status=200)
+
+class StationAutocompleteView(View):
+    def get(self, request):
+        query = request.GET.get('q', '')
+        if len(query) > AUTOCOMPLETE_MAX_QUERY_LENGTH:
+            return JsonResponse({'message': 'invalid_input'}, status=400)
+
+        stations = [station.to_dict() for station in station_directory.autocomplete(query)]
+
+        return JsonResponse({'station': stations}, status=200)
+
 class LocationDetailView(View):
     def get(self, request, location_id):
         try:
@@ -185,69 +226,133 @@ class ReviewView(View):
 
 class TaxiListView(View):
     def get(self, request):
-        departure_location_name  = request.GET.get('departure_location_name', None)
-        arrival_location_name    = request.GET.get('arrival_location_name', None)
-        seat_type                = request.GET.get('seat_type')
-        seat_remain              = request.GET.get('seat_remain')
-        departure_date_string    = request.GET.get('departure_date')
-    
-        departure_time           = request.GET.get('departure_time', '1900-01-01 23:00')
-        price                    = request.GET.get('price', 60000)
-        taxi_company             = request.GET.getlist('taxi_company', ['Dasul Taxi', 'Taxi Choi-gging', 'Art Transportation', 'Lama 운수', 'DaMo taxi', 'Muy bien Trans'])
-        sort                     = request.GET.get('sort', '-price')
-
-        sort_list = {
-            'dep_time'      : '-course__departure_time',
-            'price'         : '-price'
-        }
-        sort_string    = sort_list[sort]
+        streaming   = request.GET.get('stream') == 'true'
+        with_facets = request.GET.get('facets') == 'true'
+        cache_key   = search_cache.make_key(request.GET)
+        if not streaming:
+            content = search_cache.get(cache_key)
+            if content is not None:
+                return HttpResponse(content, content_type='application/json', status=200)
+        generation = search_cache.generation
 
-        departure_date = datetime.datetime.strptime(departure_date_string, "%Y-%m-%d")
-
-        courses = Course.objects.filter(
-            Q(departure_location__name=departure_location_name) 
-            & Q(arrival_location__name=arrival_location_name))
+        try:
+            departure_location_name  = request.GET.get('departure_location_name', None)
+            arrival_location_name    = request.GET.get('arrival_location_name', None)
+            seat_type                = request.GET.get('seat_type')
+            seat_remain              = int(request.GET.get('seat_remain'))
+            departure_date_string    = request.GET.get('departure_date')
+            return_date_string       = request.GET.get('return_date')
+
+            departure_time           = datetime.datetime.fromisoformat(request.GET.get('departure_time', '1900-01-01 23:00'))
+            return_departure_time    = datetime.datetime.fromisoformat(request.GET.get('return_departure_time', '1900-01-01 23:00'))
+            price                    = Decimal(request.GET.get('price', 60000))
+            taxi_company             = request.GET.getlist('taxi_company', ['Dasul Taxi', 'Taxi Choi-gging', 'Art Transportation', 'Lama 운수', 'DaMo taxi', 'Muy bien Trans'])
+            sort                     = request.GET.get('sort', 'price')
+
+            sort_list = {
+                'dep_time'      : 'departure_time',
+                'price'         : 'price'
+            }
+            sort_string    = sort_list[sort]
+
+            departure_date = datetime.datetime.strptime(departure_date_string, "%Y-%m-%d")
+            return_date    = datetime.datetime.strptime(return_date_string, "%Y-%m-%d") if return_date_string else None
+            if not departure_location_name or not arrival_location_name or not price.is_finite():
+                raise ValueError
+            if departure_time.tzinfo is not None or return_departure_time.tzinfo is not None:
+                raise ValueError
+            # Round trips come back as two unpaginated lists; paging parameters would be silently dropped.
+            if return_date and (streaming or request.GET.get('limit') or request.GET.get('cursor')):
+                raise ValueError
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            return JsonResponse({'message': 'invalid_input'}, status=400)
 
-        schedules = Schedule.objects.filter(
-              Q(date=departure_date) 
-            & Q(seat_type__name=seat_type)
-            & Q(course_id__in=[course.id for course in courses]) 
-            & Q(seat_remain__gte = seat_remain)
-            & Q(price__lte=price)
-            & Q(course__taxi_company__name__in = taxi_company)
-            & Q(course__departure_time__lte = departure_time)).order_by(sort_string)
+        filters = {
+            'seat_type'    : seat_type,
+            'seat_remain'  : seat_remain,
+            'price'        : price,
+            'taxi_company' : taxi_company
+        }
 
-        total_result = []
+        if return_date:
+            going_records, coming_records = search_index.routes([
+                (departure_location_name, arrival_location_name, departure_date),
+                (arrival_location_name, departure_location_name, return_date)
+            ])
+            going_schedules  = filter_schedules(going_records, departure_time=departure_time, sort=sort_string, **filters)
+            coming_schedules = filter_schedules(coming_records, departure_time=return_departure_time, sort=sort_string, **filters)
 
-        for schedule in schedules:
             result = {
-                'id'   : schedule.id,
-                'price'       : schedule.price,
-                'seat_remain' : schedule.seat_remain,
-                'date'        : schedule.date,
-                'courses' : {
-                    'departure_time'          : schedule.course.departure_time,
-                    'arrival_time'            : schedule.course.arrival_time,
-                    'taxi_code'               : schedule.course.taxi_code,
-                    'arrival_location_id'     : schedule.course.arrival_location.id,
-                    'arrival_location_name'   : schedule.course.arrival_location.name,
-                    'arrival_location_code'   : schedule.course.arrival_location.location_code,
-                    'departure_location_id'   : schedule.course.departure_location.id,
-                    'departure_location_name' : schedule.course.departure_location.name,
-                    'departure_location_code' : schedule.course.departure_location.location_code,
-                    'taxi_company'            : schedule.course.taxi_company.name,
-                    'taxi_company_url'        : schedule.course.taxi_company.logo_url
-                },
-                'seat_type' : {
-                    'seat_name' : schedule.seat_type.name,
-                    'sale_rate' : schedule.seat_type.sale_rate
-                    },
-                'taxi_driver' : {
-                    'taxi_driver_name' : schedule.taxi_driver.name,
-                    'taxi_company'     : schedule.taxi_driver.taxi_company.name,
-                    'profile_url'      : schedule.taxi_driver.profile_url,
-                    'introduction'     : schedule.taxi_driver.introduction
-                    }
+                "Message" : [schedule.to_dict() for schedule in going_schedules],
+                "return"  : [schedule.to_dict() for schedule in coming_schedules]
             }
-            total_result.append(result)
-        return JsonResponse({"Message" : total_result}, status = 200)
+            if request.GET.get('pairs') == 'true':
+                result['pairs'] = cheapest_pairs(going_schedules, coming_schedules)
+            if with_facets:
+                result['facets'] = facet_counts(going_records, departure_time=departure_time, **filters)
+
+            response = JsonResponse(result, status=200)
+            search_cache.set(cache_key, response.content, [record.id for record in going_records + coming_records], generation)
+            return response
+
+        records   = search_index.route(departure_location_name, arrival_location_name, departure_date)
+        schedules = filter_schedules(records, departure_time=departure_time, sort=sort_string, **filters)
+
+        try:
+            limit = request.GET.get('limit')
+            limit = min(int(limit), SEARCH_PAGE_MAX_LIMIT) if limit else None
+            if limit is not None and limit < 1:
+                raise ValueError
+            schedules, next_cursor = paginate(schedules, sort_string, request.GET.get('cursor'), limit)
+        except ValueError:
+            return JsonResponse({'message': 'invalid_limit'}, status=400)
+        except InvalidCursor:
+            return JsonResponse({'message': 'invalid_cursor'}, status=400)
+
+        if streaming:
+            return StreamingHttpResponse(
+                    self.stream(schedules, limit, next_cursor),
+                    content_type = 'application/json',
+                    status       = 200
+                    )
+
+        total_result = {"Message" : [schedule.to_dict() for schedule in schedules]}
+        if limit is not None:
+            total_result['next_cursor'] = next_cursor
+        if with_facets:
+            total_result['facets'] = facet_counts(records, departure_time=departure_time, **filters)
+
+        response = JsonResponse(total_result, status = 200)
+
+        search_cache.set(cache_key, response.content, [record.id for record in records], generation)
+        return response
+
+    def stream(self, schedules, limit, next_cursor):
+        encoder = DjangoJSONEncoder()
+
+        yield '{"Message": ['
+        for index, schedule in enumerate(schedules):
+            yield (',' if index else '') + encoder.encode(schedule.to_dict())
+        if limit is None:
+            yield ']}'
+        else:
+            yield '], "next_cursor": ' + encoder.encode(next_cursor) + '}'
+
+class FareCalendarView(View):
+    def get(self, request):
+        try:
+            departure_location_name = request.GET['departure_location_name']
+            arrival_location_name   = request.GET['arrival_location_name']
+            start_date              = datetime.datetime.strptime(request.GET['start_date'], "%Y-%m-%d").date()
+            end_date                = datetime.datetime.strptime(request.GET['end_date'], "%Y-%m-%d").date()
+        except KeyError:
+            return JsonResponse({'message': 'key_error'}, status=400)
+        except ValueError:
+            return JsonResponse({'message': 'invalid_date'}, status=400)
+
+        if not 0 <= (end_date - start_date).days < CALENDAR_MAX_DAYS:
+            return JsonResponse({'message': 'invalid_date_range'}, status=400)
+
+        calendar = fare_calendar.get(departure_location_name, arrival_location_name, start_date, end_date)
+
+        return JsonResponse({'calendar': calendar}, status=200)
@@ -0,0 +1,126 @@
+import copy
+import time
+import hashlib
+import threading
+from collections  import OrderedDict
+
+from users.models import User
+
+USER_CACHE_MAX_SIZE = 10000
+USER_CACHE_TTL      = 60
+
+TOKEN_CACHE_MAX_SIZE = 10000
+
+class UserCache:
+    def __init__(self, max_size=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL):
+        self.max_size   = max_size
+        self.ttl        = ttl
+        self.entries    = OrderedDict()
+        self.generation = 0
+        self.hits       = 0
+        self.misses     = 0
+        self.lock       = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                # Views may set attributes on request.user, so never hand out the shared instance.
+                return copy.copy(entry[1])
+            self.misses += 1
+            generation = self.generation
+
+        user = User.objects.get(id=user_id)
+
+        with self.lock:
+            # A write that landed while the row was being read leaves it possibly stale; skip caching it.
+            if generation == self.generation:
+                self.entries[user_id] = (time.monotonic() + self.ttl, user)
+                self.entries.move_to_end(user_id)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return copy.copy(user)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+class TokenCache:
+    """
+    Decoded JWT payloads keyed by a digest of the token, kept until the wall-clock deadline passed to
+    set(), so a hit never outlives the token it stands for.
+    """
+    def __init__(self, max_size=TOKEN_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self.entries  = OrderedDict()
+        self.users    = {}
+        self.hits     = 0
+        self.misses   = 0
+        self.lock     = threading.Lock()
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self.digest(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[2])
+            if entry:
+                self._discard(key)
+            self.misses += 1
+            return None
+
+    def set(self, token, payload, deadline):
+        if deadline <= time.time():
+            return
+        key = self.digest(token)
+        with self.lock:
+            self._discard(key)
+            self.entries[key] = (deadline, payload['user_id'], dict(payload))
+            self.users.setdefault(payload['user_id'], set()).add(key)
+            while len(self.entries) > self.max_size:
+                self._discard(next(iter(self.entries)))
+
+    def revoke_user(self, user_id):
+        with self.lock:
+            for key in list(self.users.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.users.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if not entry:
+            return
+        keys = self.users.get(entry[1])
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self.users[entry[1]]
+
+user_cache  = UserCache()
+token_cache = TokenCache()
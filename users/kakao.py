@@ -0,0 +1,109 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters  import HTTPAdapter
+from asgiref.sync       import sync_to_async
+from django.conf        import settings
+
+logger = logging.getLogger(__name__)
+
+KAKAO_POOL_SIZE          = 20
+KAKAO_FAILURE_THRESHOLD  = 5
+KAKAO_RESET_TIMEOUT      = 30
+KAKAO_BACKGROUND_WORKERS = 2
+
+class KakaoUnavailable(Exception):
+    pass
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for `reset_timeout` seconds; then
+    lets a single trial call through, closing again on success.
+    """
+    def __init__(self, threshold=KAKAO_FAILURE_THRESHOLD, reset_timeout=KAKAO_RESET_TIMEOUT):
+        self.threshold     = threshold
+        self.reset_timeout = reset_timeout
+        self.failures      = 0
+        self.opened_at     = None
+        self.trial         = False
+        self.lock          = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() < self.opened_at + self.reset_timeout:
+                return False
+            self.trial = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures  = 0
+            self.opened_at = None
+            self.trial     = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial     = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    def reset(self):
+        self.record_success()
+
+class KakaoClient:
+    def __init__(self, pool_size=KAKAO_POOL_SIZE, breaker=None):
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.breaker    = breaker or CircuitBreaker()
+        self.background = ThreadPoolExecutor(max_workers=KAKAO_BACKGROUND_WORKERS, thread_name_prefix='kakao')
+
+    def request(self, method, path, access_token):
+        if not self.breaker.allow():
+            raise KakaoUnavailable('circuit open')
+
+        try:
+            response = self.session.request(
+                    method,
+                    settings.KAKAO_API_URL + path,
+                    headers = {'Authorization': 'Bearer ' + access_token},
+                    timeout = (settings.KAKAO_CONNECT_TIMEOUT, settings.KAKAO_READ_TIMEOUT)
+                    )
+            if response.status_code >= 500:
+                raise KakaoUnavailable('status {}'.format(response.status_code))
+            data = response.json()
+        except (requests.RequestException, ValueError, KakaoUnavailable) as error:
+            self.breaker.record_failure()
+            raise KakaoUnavailable(str(error)) from error
+
+        self.breaker.record_success()
+        return data
+
+    def user_info(self, access_token):
+        return self.request('GET', '/v2/user/me', access_token)
+
+    def logout(self, access_token):
+        return self.request('GET', '/v1/user/logout', access_token)
+
+    def logout_later(self, access_token):
+        # Fire and forget: the caller has already ended the local session.
+        def logout():
+            try:
+                self.logout(access_token)
+            except KakaoUnavailable as error:
+                logger.warning('kakao logout failed: %s', error)
+        return self.background.submit(logout)
+
+    async def user_info_async(self, access_token):
+        return await sync_to_async(self.user_info, thread_sensitive=False)(access_token)
+
+    async def logout_async(self, access_token):
+        return await sync_to_async(self.logout, thread_sensitive=False)(access_token)
+
+kakao_client = KakaoClient()
@@ -0,0 +1,87 @@
+import sys
+import json
+import time
+import zlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for kapi.kakao.com in tests and benchmarks. Any bearer token is accepted and maps to a stable
+# fake account; the tokens 'invalid' and 'expired' get Kakao's error bodies.
+STUB_ERRORS = {
+    'invalid' : {'msg': 'this access token does not exist', 'code': -401},
+    'expired' : {'msg': 'this access token is already expired', 'code': -401},
+}
+
+def stub_account(token):
+    kakao_id = zlib.crc32(token.encode('utf-8')) & 0x7fffffff
+    return {
+        'id'            : kakao_id,
+        'kakao_account' : {
+            'email'   : 'kakao{}@example.com'.format(kakao_id),
+            'profile' : {
+                'nickname'            : 'kakao {}'.format(kakao_id),
+                'thumbnail_image_url' : 'https://example.com/{}.png'.format(kakao_id)
+            }
+        }
+    }
+
+class KakaoStubHandler(BaseHTTPRequestHandler):
+    protocol_version        = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.calls[self.path] = self.server.calls.get(self.path, 0) + 1
+        time.sleep(self.server.delay)
+
+        token = self.headers.get('Authorization', '').replace('Bearer ', '', 1)
+        if token in STUB_ERRORS:
+            return self.reply(401, STUB_ERRORS[token])
+
+        if self.path == '/v2/user/me':
+            return self.reply(200, stub_account(token))
+        if self.path == '/v1/user/logout':
+            return self.reply(200, {'id': stub_account(token)['id']})
+        return self.reply(404, {'msg': 'not found', 'code': -404})
+
+    def reply(self, status, body):
+        content = json.dumps(body).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json;charset=UTF-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out and hung up while we were sleeping; that is the point of a delay.
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+class KakaoStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0):
+        super().__init__((host, port), KakaoStubHandler)
+        self.delay = delay
+        self.calls = {}
+        self.lock  = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Connections the client dropped mid-request are expected here, not worth a traceback.
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
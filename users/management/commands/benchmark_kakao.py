@@ -0,0 +1,40 @@
+import time
+import statistics
+
+import requests
+from django.core.management.base import BaseCommand
+from django.test                 import override_settings
+
+from users.kakao                 import KakaoClient
+from users.kakao_stub            import KakaoStubServer
+
+class Command(BaseCommand):
+    help = 'Compare pooled Kakao client calls with one-off requests against the local Kakao stub'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=200)
+        parser.add_argument('--delay', type=float, default=0, help='seconds the stub stalls every response')
+
+    def handle(self, *args, **options):
+        server = KakaoStubServer(delay=options['delay']).start()
+        try:
+            with override_settings(KAKAO_API_URL=server.url):
+                client = KakaoClient()
+                self.report('pooled client', lambda: client.user_info('token'), options['calls'])
+                self.report('fresh connection', lambda: requests.get(
+                    server.url + '/v2/user/me', headers={'Authorization': 'Bearer token'}).json(), options['calls'])
+        finally:
+            server.stop()
+
+    def report(self, label, call, calls):
+        latencies = []
+        started   = time.perf_counter()
+        for _ in range(calls):
+            call_started = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - call_started) * 1000)
+        elapsed = time.perf_counter() - started
+
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write('{}: {:.1f} calls/s  p50 {:.2f}ms  p95 {:.2f}ms  p99 {:.2f}ms'.format(
+            label, calls / elapsed, percentiles[49], percentiles[94], percentiles[98]))
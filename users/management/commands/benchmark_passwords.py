@@ -0,0 +1,52 @@
+import os
+import time
+import asyncio
+import statistics
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+
+from users.passwords             import PasswordHasher, hash_password, check_password
+
+BENCH_PASSWORD = 'P@ssw0rd'
+
+class Command(BaseCommand):
+    help = 'Report bcrypt sign-in verifications per second, overall and per core, through the password hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signins', type=int, default=100)
+        parser.add_argument('--rounds', type=int, default=None, help='work factor, defaults to BCRYPT_ROUNDS')
+        parser.add_argument('--workers', type=int, default=None, help='hasher threads, defaults to PASSWORD_HASH_WORKERS')
+
+    def handle(self, *args, **options):
+        rounds  = options['rounds'] or settings.BCRYPT_ROUNDS
+        workers = options['workers'] or settings.PASSWORD_HASH_WORKERS
+        cores   = min(workers, os.cpu_count() or 1)
+        hashed  = hash_password(BENCH_PASSWORD, rounds)
+
+        started = time.perf_counter()
+        check_password(BENCH_PASSWORD, hashed)
+        self.stdout.write('rounds {}: one verification blocks its thread for {:.1f}ms'.format(
+            rounds, (time.perf_counter() - started) * 1000))
+
+        hasher = PasswordHasher(workers=workers, queue_per_worker=options['signins'])
+        try:
+            latencies, elapsed = asyncio.run(self.run(hasher, hashed, options['signins']))
+        finally:
+            hasher.shutdown()
+
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write('{} sign-ins on {} workers: {:.1f}/s, {:.1f}/s per core'.format(
+            len(latencies), workers, len(latencies) / elapsed, len(latencies) / elapsed / cores))
+        self.stdout.write('latency under load: p50 {:.1f}ms  p95 {:.1f}ms  p99 {:.1f}ms'.format(
+            percentiles[49], percentiles[94], percentiles[98]))
+
+    async def run(self, hasher, hashed, signins):
+        async def signin():
+            started = time.perf_counter()
+            await hasher.check(BENCH_PASSWORD, hashed)
+            return (time.perf_counter() - started) * 1000
+
+        started   = time.perf_counter()
+        latencies = await asyncio.gather(*[signin() for _ in range(signins)])
+        return latencies, time.perf_counter() - started
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from users.kakao_stub            import KakaoStubServer
+
+class Command(BaseCommand):
+    help = 'Serve a local stand-in for the Kakao user API; point KAKAO_API_URL at it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay', type=float, default=0, help='seconds to stall every response')
+
+    def handle(self, *args, **options):
+        server = KakaoStubServer(options['host'], options['port'], options['delay'])
+        self.stdout.write('kakao stub listening on {}'.format(server.url))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_auto_20210530_2134'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='is_operator',
+            field=models.BooleanField(default=False),
+        ),
+    ]
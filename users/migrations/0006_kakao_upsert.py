@@ -0,0 +1,40 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:10
+
+from django.db import migrations, models
+from django.db.models import Max, Min, Count
+import django.db.models.deletion
+
+
+def deduplicate_kakao_rows(apps, schema_editor):
+    User       = apps.get_model('users', 'User')
+    KakaoToken = apps.get_model('users', 'KakaoToken')
+
+    # Keep the oldest account per kakao_id and the newest token per user before the unique constraints land.
+    duplicated = User.objects.exclude(kakao_id=None).values('kakao_id').annotate(count=Count('id'), keep=Min('id')).filter(count__gt=1)
+    for row in duplicated:
+        User.objects.filter(kakao_id=row['kakao_id']).exclude(id=row['keep']).update(kakao_id=None)
+
+    duplicated = KakaoToken.objects.values('user_id').annotate(count=Count('id'), keep=Max('id')).filter(count__gt=1)
+    for row in duplicated:
+        KakaoToken.objects.filter(user_id=row['user_id']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_is_operator'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_kakao_rows, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='kakaotoken',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='users.user'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='kakao_id',
+            field=models.BigIntegerField(null=True, unique=True),
+        ),
+    ]
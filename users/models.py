@@ -4,7 +4,7 @@ class User(models.Model):
     name                 = models.CharField(max_length=45)
     email                = models.CharField(max_length=1000)
     password             = models.CharField(max_length=1000)
-    kakao_id             = models.IntegerField(null=True)
+    kakao_id             = models.BigIntegerField(null=True, unique=True)
     phone_number         = models.CharField(max_length=100, null=True)
     profile_url          = models.URLField(max_length=2000, null=True)
     refund_account       = models.CharField(max_length=1000, null=True)
@@ -12,11 +12,12 @@ class User(models.Model):
     point                = models.IntegerField(default=0)
     coupon               = models.ManyToManyField("Coupon", through="UserCoupon", null=True)
     refresh_token        = models.CharField(max_length=1000, null=True)
+    is_operator          = models.BooleanField(default=False)
     class Meta:
         db_table = "users"
 
 class KakaoToken(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
     token = models.CharField(max_length=2000)
     class Meta:
         db_table = "kakao_tokens"
@@ -0,0 +1,84 @@
+import asyncio
+import bcrypt
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf        import settings
+
+# Work queued beyond this many hashes per worker is refused instead of piling up behind a login spike.
+PASSWORD_HASH_QUEUE_PER_WORKER = 32
+# Stored in place of a hash for accounts that sign in through Kakao; bcrypt never produces it.
+UNUSABLE_PASSWORD_PREFIX       = '!'
+
+class PasswordHasherBusy(Exception):
+    pass
+
+def hash_password(password, rounds=None):
+    rounds = settings.BCRYPT_ROUNDS if rounds is None else rounds
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def make_unusable_password():
+    return UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(32)
+
+def check_password(password, hashed):
+    if hashed.startswith(UNUSABLE_PASSWORD_PREFIX):
+        return False
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def hash_rounds(hashed):
+    # Modular crypt format: $2b$<cost>$<salt and digest>
+    return int(hashed.split('$')[2])
+
+def needs_rehash(hashed, rounds=None):
+    rounds = settings.BCRYPT_ROUNDS if rounds is None else rounds
+    return hash_rounds(hashed) != rounds
+
+class PasswordHasher:
+    """
+    A dedicated thread pool for bcrypt, which releases the GIL while it works. Async views await it
+    so the event loop keeps serving other requests; the pending queue is bounded.
+    """
+    def __init__(self, workers=None, queue_per_worker=PASSWORD_HASH_QUEUE_PER_WORKER):
+        self.workers          = workers
+        self.queue_per_worker = queue_per_worker
+        self.executor         = None
+        self.slots            = None
+        self.lock             = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.executor is None:
+                workers       = self.workers or settings.PASSWORD_HASH_WORKERS
+                self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+                self.slots    = threading.BoundedSemaphore(workers * self.queue_per_worker)
+        return self.executor
+
+    def submit(self, function, *args):
+        executor = self.start()
+        if not self.slots.acquire(blocking=False):
+            raise PasswordHasherBusy
+        try:
+            future = executor.submit(function, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda future: self.slots.release())
+        return future
+
+    async def run(self, function, *args):
+        return await asyncio.wrap_future(self.submit(function, *args))
+
+    async def hash(self, password, rounds=None):
+        return await self.run(hash_password, password, rounds)
+
+    async def check(self, password, hashed):
+        return await self.run(check_password, password, hashed)
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+
+password_hasher = PasswordHasher()
@@ -1,3 +1,185 @@
-from django.test import TestCase
+import jwt
+import json
+import time
+import asyncio
+from unittest          import mock
 
-# Create your tests here.
+from django.test       import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db         import connection
+from django.db.models  import QuerySet
+
+from my_settings       import SECRET
+from users.models      import User, KakaoToken
+from users.cache       import user_cache, token_cache
+from users.passwords   import hash_password, hash_rounds
+from users.kakao       import kakao_client
+from users.kakao_stub  import KakaoStubServer, stub_account
+from users.views       import SigninView, SignupView
+
+class UserCacheTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        User.objects.create(id=1, name='user', email='user@example.com', password='')
+
+    def test_user_cache_hits_and_invalidates(self):
+        hits = user_cache.hits
+
+        with self.assertNumQueries(1):
+            first  = user_cache.get(1)
+            second = user_cache.get(1)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(user_cache.hits, hits + 1)
+
+        first.refresh_token = 'token'
+        first.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user_cache.get(1).refresh_token, 'token')
+
+        User.objects.get(id=1).delete()
+
+        with self.assertRaises(User.DoesNotExist):
+            user_cache.get(1)
+
+    def test_refresh_reads_revoked_token_from_database(self):
+        now     = time.time()
+        refresh = jwt.encode({'user_id': 1, 'iat': now}, SECRET, algorithm='HS256')
+        expired = jwt.encode({'user_id': 1, 'iat': now - 700}, SECRET, algorithm='HS256')
+        User.objects.filter(id=1).update(refresh_token=refresh)
+        token_cache.clear()
+
+        self.assertEqual(Client().get('/users/userinfo', HTTP_Authorization=expired).json()['message'], 'access_token_refreshed')
+
+        # A logout handled by another process clears the row without touching this process's cache.
+        User.objects.filter(id=1).update(refresh_token=None)
+
+        self.assertEqual(Client().get('/users/userinfo', HTTP_Authorization=expired).json(), {'message': 'invalid_jwt'})
+
+class TokenCacheTest(TestCase):
+    def setUp(self):
+        token_cache.clear()
+
+    def test_token_cache_expires_and_revokes(self):
+        now = time.time()
+
+        token_cache.set('expired', {'user_id': 1, 'iat': now - 700}, now - 100)
+        token_cache.set('fresh', {'user_id': 1, 'iat': now}, now + 600)
+        token_cache.set('other', {'user_id': 2, 'iat': now}, now + 600)
+
+        self.assertIsNone(token_cache.get('expired'))
+        self.assertEqual(token_cache.get('fresh'), {'user_id': 1, 'iat': now})
+
+        token_cache.revoke_user(1)
+
+        self.assertIsNone(token_cache.get('fresh'))
+        self.assertIsNotNone(token_cache.get('other'))
+
+class SigninTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        User.objects.create(id=1, name='user', email='user@example.com', password=hash_password('P@ssw0rd', rounds=4))
+
+    @override_settings(BCRYPT_ROUNDS=5)
+    def test_signin_rehashes_outdated_work_factor(self):
+        client = Client()
+
+        response = client.post('/users/signin', json.dumps({'email': 'user@example.com', 'password': 'wrong'}), content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(hash_rounds(User.objects.get(id=1).password), 4)
+
+        response = client.post('/users/signin', json.dumps({'email': 'user@example.com', 'password': 'P@ssw0rd'}), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(hash_rounds(User.objects.get(id=1).password), 5)
+
+        response = client.post('/users/signin', json.dumps({'email': 'user@example.com', 'password': 'P@ssw0rd'}), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_async_views_are_coroutine_functions(self):
+        self.assertTrue(asyncio.iscoroutinefunction(SigninView.as_view()))
+        self.assertTrue(asyncio.iscoroutinefunction(SignupView.as_view()))
+
+class KakaoSigninTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = KakaoStubServer(delay=0).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        kakao_client.breaker.reset()
+        self.stub.delay = 0
+
+    def signin(self, access_token):
+        with self.settings(KAKAO_API_URL=self.stub.url, KAKAO_READ_TIMEOUT=0.2):
+            return Client().post('/users/kakaosignin', json.dumps({'access_token': access_token, 'refresh_token': 'refresh'}), content_type='application/json')
+
+    def test_kakao_signin(self):
+        first  = self.signin('token')
+        second = self.signin('token')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(User.objects.filter(email__startswith='kakao').count(), 1)
+        self.assertEqual(KakaoToken.objects.count(), 1)
+        self.assertEqual(self.signin('expired').json(), {'message': 'login_again'})
+
+    def test_kakao_user_password_unusable(self):
+        self.signin('token')
+        user = User.objects.get(email__startswith='kakao')
+
+        response = Client().post('/users/signin', json.dumps({'email': user.email, 'password': user.password}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'message': 'invalid_password'})
+
+    def test_kakao_signin_statements(self):
+        self.signin('token')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.signin('token').status_code, 201)
+
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))]
+        self.assertEqual(len(statements), 3)
+
+    def test_kakao_token_upsert_race(self):
+        self.signin('token')
+        user = User.objects.get(email__startswith='kakao')
+        KakaoToken.objects.all().delete()
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            # The first UPDATE finds no token; a concurrent sign-in then inserts one before ours.
+            if not KakaoToken.objects.exists():
+                KakaoToken.objects.create(user=user, token='concurrent')
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            self.assertEqual(self.signin('token').status_code, 201)
+
+        self.assertEqual(list(KakaoToken.objects.values_list('token', flat=True)), ['token refresh'])
+
+    def test_kakao_signin_email_taken(self):
+        email = stub_account('taken')['kakao_account']['email']
+        User.objects.create(name='user', email=email, password='')
+
+        self.assertEqual(self.signin('taken').json(), {'message': 'already_exists', 'email': email})
+
+    def test_kakao_timeouts_open_circuit(self):
+        self.stub.delay = 0.5
+        for _ in range(kakao_client.breaker.threshold):
+            self.assertEqual(self.signin('token').status_code, 503)
+
+        calls   = dict(self.stub.calls)
+        started = time.monotonic()
+
+        self.assertEqual(self.signin('token').json(), {'message': 'kakao_unavailable'})
+        self.assertLess(time.monotonic() - started, 0.2)
+        time.sleep(0.5)
+        self.assertEqual(self.stub.calls, calls)
@@ -1,22 +1,24 @@
 import json
 import jwt
+import asyncio
 import datetime
-import requests
-import bcrypt
-import string
-import random
 from json.decoder      import JSONDecodeError
 
 from django.http       import JsonResponse
 from django.views      import View
+from django.db         import transaction, IntegrityError
+from django.db.models  import Q
+from asgiref.sync      import sync_to_async, markcoroutinefunction
 
 from users.models      import User, KakaoToken
 from my_settings       import SECRET
 from users.validations import Validation
 from decorators        import validate_login
+from users.cache       import token_cache
+from users.passwords   import password_hasher, make_unusable_password, needs_rehash, PasswordHasherBusy
+from users.kakao       import kakao_client, KakaoUnavailable
 
 KAKAO_REST_API_KEY  = "bf3992782086681b3a5421eaa743704d"
-MAX_PASSWORD_LENGTH = 15
 
 class UserInfoView(View):
     @validate_login
@@ -29,8 +31,23 @@ class UserInfoView(View):
                 }
         return JsonResponse({'message': 'success', 'user_info': user_info}, status=200)
 
-class SignupView(View):
-    def post(self, request):
+class AsyncView(View):
+    """
+    Django 3.2 class-based views are always run synchronously; marking the view callable as a
+    coroutine function lets an ASGI server await async handlers without tying up a worker thread.
+    """
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return markcoroutinefunction(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+class SignupView(AsyncView):
+    async def post(self, request):
         try:
             data = json.loads(request.body)
             name = data['name']
@@ -46,15 +63,12 @@ class SignupView(View):
             if not Validation.validate_name(self, name):
                 return JsonResponse({'message':'invalid_name'}, status=400)
             
-            if not Validation.validate_duplication(self, email):
+            if not await sync_to_async(Validation.validate_duplication)(self, email):
                 return JsonResponse({'message':'already_exists', 'email':email}, status=400)
 
-            password = bcrypt.hashpw(
-                    password.encode('utf-8'),
-                    bcrypt.gensalt()
-                    ).decode('utf-8')
+            password = await password_hasher.hash(password)
 
-            user = User.objects.create(
+            user = await sync_to_async(User.objects.create)(
                     name     = name,
                     password = password,
                     email    = email
@@ -65,18 +79,24 @@ class SignupView(View):
             return JsonResponse({'message': 'key_error'}, status=400)
         except JSONDecodeError:
             return JsonResponse({'message': 'no_body'}, status=400)
+        except PasswordHasherBusy:
+            return JsonResponse({'message': 'server_busy'}, status=503)
 
-class SigninView(View):
-    def post(self, request):
+class SigninView(AsyncView):
+    async def post(self, request):
         try:
             data  = json.loads(request.body)
             email = data['email']
 
-            user = User.objects.get(email=email)
+            user = await sync_to_async(User.objects.get)(email=email)
 
-            if not bcrypt.checkpw(data['password'].encode('utf-8'), user.password.encode('utf-8')):
+            if not await password_hasher.check(data['password'], user.password):
                 return JsonResponse({'message':'invalid_password'}, status=401)
 
+            # Upgrade hashes made under an older work factor while the plain password is at hand.
+            if needs_rehash(user.password):
+                user.password = await password_hasher.hash(data['password'])
+
             access_token = jwt.encode(
                     {
                         'user_id': user.id,
@@ -95,7 +115,7 @@ class SigninView(View):
             )
 
             user.refresh_token = refresh_token
-            user.save()
+            await sync_to_async(user.save)()
 
             return JsonResponse({'access_token': access_token}, status=201)
         except KeyError:
@@ -104,18 +124,20 @@ class SigninView(View):
             return JsonResponse({'message': 'no_body'}, status=400)
         except User.DoesNotExist:
             return JsonResponse({'message': 'invalid_email'}, status=400)
+        except PasswordHasherBusy:
+            return JsonResponse({'message': 'server_busy'}, status=503)
 
 class KakaoSigninView(View):
     def post(self, request):
         try:
-            kakao_access_token  = json.loads(request.body).get("access_token", None)
-            kakao_refresh_token = json.loads(request.body).get("refresh_token", None)
+            data                = json.loads(request.body)
+            kakao_access_token  = data.get("access_token", None)
+            kakao_refresh_token = data.get("refresh_token", None)
             
             if not kakao_access_token or not kakao_refresh_token:
                 return JsonResponse({'message': 'kakaotoken_required'}, status=401)
 
-            USER_INFO_API   = 'https://kapi.kakao.com/v2/user/me'
-            kakao_user_info = requests.get(USER_INFO_API, headers={'Authorization': 'Bearer ' + kakao_access_token}).json()
+            kakao_user_info = kakao_client.user_info(kakao_access_token)
             
             if kakao_user_info.get("msg") == "this access token does not exist":
                 return JsonResponse({'message': 'invalid_jwt'}, status=401)
@@ -128,60 +150,78 @@ class KakaoSigninView(View):
             email       = kakao_user_info["kakao_account"]["email"]
             profile_url = kakao_user_info["kakao_account"]["profile"]["thumbnail_image_url"]
 
-            if User.objects.filter(kakao_id=kakao_id).exists():
-                user = User.objects.get(kakao_id=kakao_id)
-            elif User.objects.filter(email=email).exists():
-                return JsonResponse({'message':'already_exists', 'email':email}, status=400)
-            else:
-                letters         = string.ascii_lowercase + string.ascii_uppercase + string.digits + string.punctuation
-                random_string   = ''.join(random.choice(letters) for _ in range(MAX_PASSWORD_LENGTH))
-                random_password = bcrypt.hashpw(
-                            random_string.encode('utf-8'),
-                            bcrypt.gensalt()
-                            ).decode('utf-8')
-                user = User.objects.create(
-                        name = name,
-                        email = email,
-                        password = random_password,
-                        kakao_id = kakao_user_info.get("id"),
-                        profile_url = profile_url
-                        )
-
-            kakao_token_string  = kakao_access_token + ' ' + kakao_refresh_token
-
-            if KakaoToken.objects.filter(user=user).exists():
-                kakao_token = KakaoToken.objects.get(user=user)
-                kakao_token.token = kakao_token_string
-                kakao_token.save()
-            else:
-                kakao_token = KakaoToken.objects.create(
-                        user  = user,
-                        token = kakao_token_string
-                        )
-
-            access_token = jwt.encode(
-                    {
-                        'user_id': user.id,
-                        'iat'    : datetime.datetime.now().timestamp()
-                    },
-                    SECRET,
-                    algorithm = 'HS256'
-            )
-            refresh_token = jwt.encode(
-                    {
-                        'user_id': user.id,
-                        'iat'    : datetime.datetime.now().timestamp()
-                    },
-                    SECRET,
-                    algorithm = 'HS256'
-            )
-
-            user.refresh_token = refresh_token
-            user.save()
+            kakao_token_string = kakao_access_token + ' ' + kakao_refresh_token
+
+            with transaction.atomic():
+                # One lookup answers both "returning Kakao user" and "email taken by a password account".
+                users       = list(User.objects.filter(Q(kakao_id=kakao_id) | Q(email=email)))
+                kakao_user  = next((user for user in users if user.kakao_id == kakao_id), None)
+                email_taken = any(user.email == email for user in users)
+
+                if not kakao_user and email_taken:
+                    return JsonResponse({'message':'already_exists', 'email':email}, status=400)
+
+                user, created = kakao_user, False
+                if not user:
+                    user, created = self.create_user(kakao_id, name, email, profile_url)
+
+                if created:
+                    KakaoToken.objects.create(user=user, token=kakao_token_string)
+                else:
+                    self.save_token(user, kakao_token_string)
+
+                access_token = jwt.encode(
+                        {
+                            'user_id': user.id,
+                            'iat'    : datetime.datetime.now().timestamp()
+                        },
+                        SECRET,
+                        algorithm = 'HS256'
+                )
+                refresh_token = jwt.encode(
+                        {
+                            'user_id': user.id,
+                            'iat'    : datetime.datetime.now().timestamp()
+                        },
+                        SECRET,
+                        algorithm = 'HS256'
+                )
+
+                user.refresh_token = refresh_token
+                user.save(update_fields=['refresh_token'])
 
             return JsonResponse({'message': 'success', 'user': user.name, 'access_token': access_token}, status=201)
         except KeyError:
             return JsonResponse({'message': 'key_error'}, status=400)
+        except JSONDecodeError:
+            return JsonResponse({'message': 'no_body'}, status=400)
+        except KakaoUnavailable:
+            return JsonResponse({'message': 'kakao_unavailable'}, status=503)
+
+    def save_token(self, user, token):
+        # update_or_create, minus its locking SELECT: the common returning-user case is one UPDATE.
+        if KakaoToken.objects.filter(user=user).update(token=token):
+            return
+        try:
+            with transaction.atomic():
+                KakaoToken.objects.create(user=user, token=token)
+        except IntegrityError:
+            # A concurrent sign-in inserted the row after our UPDATE found none; update theirs instead.
+            KakaoToken.objects.filter(user=user).update(token=token)
+
+    def create_user(self, kakao_id, name, email, profile_url):
+        try:
+            with transaction.atomic():
+                return User.objects.create(
+                        name        = name,
+                        email       = email,
+                        password    = make_unusable_password(),
+                        kakao_id    = kakao_id,
+                        profile_url = profile_url
+                        ), True
+        except IntegrityError:
+            # A concurrent first sign-in for the same Kakao account won the unique kakao_id.
+            return User.objects.get(kakao_id=kakao_id), False
 
 
 class LogoutView(View):
@@ -201,12 +241,12 @@ class LogoutView(View):
             user = User.objects.get(id=access_token_payload['user_id'])
             user.refresh_token = None
             user.save()
+            token_cache.revoke_user(user.id)
 
             kakao_token = KakaoToken.objects.get(user=user)
             kakao_access_token = kakao_token.token.split()[0]
-            
-            LOGOUT_API  = 'https://kapi.kakao.com/v1/user/logout'
-            logout_user = requests.get(LOGOUT_API, headers={'Authorization': 'Bearer ' + kakao_access_token})
+
+            kakao_client.logout_later(kakao_access_token)
 
             return JsonResponse({'message': 'success'}, status=201)
         except jwt.exceptions.DecodeError:
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from my_settings import DATABASES, SECRET
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -126,6 +127,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 APPEND_SLASH = False
 
+SEAT_HOLD_TTL = 600
+
+BCRYPT_ROUNDS = 12
+PASSWORD_HASH_WORKERS = os.cpu_count() or 1
+
+KAKAO_API_URL = 'https://kapi.kakao.com'
+KAKAO_CONNECT_TIMEOUT = 1.0
+KAKAO_READ_TIMEOUT = 3.0
+
 CORS_ORIGIN_ALLOW_ALL=True
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_METHODS = (
@@ -146,5 +156,6 @@ CORS_ALLOW_HEADERS = (
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
 
 )